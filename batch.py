@@ -0,0 +1,195 @@
+"""
+Batch game stepping.
+
+Represents many games at once as NumPy arrays of shape (games, 8, 8) for
+ships, hits and misses and applies one shot per game per step, so millions
+of games can be simulated without a Python loop per game.
+
+Only the board being targeted is simulated, which is all that is needed to
+measure how many shots a targeting strategy takes to sink a fleet.
+"""
+from sys import argv
+from time import perf_counter
+
+import numpy as np
+
+from game import ships, board_size, board_engine, placement_masks
+
+
+# placement matrices keyed by board size and ship length, with a row per
+# placement and a column per point, in the same order as the placement index
+placement_matrices = {}
+
+# times the fleets of the boards they could not be placed on are drawn again
+# before giving up, which the standard fleet never needs
+placement_attempts = 100
+
+
+def get_placement_matrix(size, length):
+    """
+    Returns the placement matrix of ships of the given length on boards of
+    the given size, building it the first time it is needed.
+    """
+    if (size, length) not in placement_matrices:
+        area = size[0] * size[1]
+        placement_matrices[(size, length)] = np.array([
+            [mask >> point & 1 for point in range(area)]
+            for mask in placement_masks(size, length)
+        ], dtype=np.float32)
+    return placement_matrices[(size, length)]
+
+
+def place_fleets(rng, occupied, lengths, size=board_size):
+    """
+    Places a fleet of ships of the given lengths on every board, given as
+    a row of occupied marking the points ships may not go through, each
+    ship in a placement chosen uniformly from the ones that do not go
+    through those points or the ships placed so far, which are marked in
+    occupied as they are placed.
+
+    Returns a mask of the boards on which every ship could be placed.
+    """
+    placed = np.ones(len(occupied), dtype=bool)
+    for length in lengths:
+        cover = get_placement_matrix(size, length)
+        legal = occupied @ cover.T == 0
+        placed &= legal.any(axis=1)
+        # the legal placement with the highest random key is picked,
+        # which is a uniform choice among the legal placements
+        keys = rng.random(legal.shape)
+        keys[~legal] = -1
+        occupied += cover[keys.argmax(axis=1)]
+    return placed
+
+
+class BatchBoards():
+    """
+    Initializes a batch of boards:
+
+    Boolean arrays with a board per game, together with the ship count of
+    every game. A hit point stays marked in ships, so hits are always a
+    subset of ships and misses never overlap them.
+
+    Holds the standard fleet unless it is given one, with ship names as
+    keys and lengths as values.
+    """
+
+    def __init__(self, games, fleet=None):
+        self.fleet = fleet if fleet else ships
+        self.ships = np.zeros((games, 8, 8), dtype=bool)
+        self.hits = np.zeros((games, 8, 8), dtype=bool)
+        self.misses = np.zeros((games, 8, 8), dtype=bool)
+        self.ship_count = np.full(games, sum(self.fleet.values()),
+                                  dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ship_count)
+
+    def place_randomly(self, rng):
+        """
+        Places a fleet on every board, each ship in a placement chosen
+        uniformly from the ones that do not overlap the ships placed so far.
+        The fleets of the boards a ship ran out of placements on are drawn
+        again from scratch.
+
+        Raises a ValueError if some fleet still could not be placed after
+        as many draws as placement_attempts.
+        """
+        games = len(self)
+        occupied = np.zeros((games, 64), dtype=np.float32)
+        unplaced = np.arange(games)
+        for _ in range(placement_attempts):
+            fleets = np.zeros((len(unplaced), 64), dtype=np.float32)
+            placed = place_fleets(rng, fleets, self.fleet.values())
+            occupied[unplaced] = fleets
+            unplaced = unplaced[~placed]
+            if not len(unplaced):
+                break
+        else:
+            raise ValueError(
+                f"The fleet could not be placed on {len(unplaced)} boards.")
+        self.ships = occupied.reshape(games, 8, 8) > 0
+
+    def is_over(self):
+        """
+        Returns a mask of the games in which all ships were sunk.
+        """
+        return self.ship_count == 0
+
+    def fire(self, targets):
+        """
+        Fires one shot in every game that is not over yet.
+
+        Expects an array of (row, column) targets, one per game. Returns an
+        array with 1 for every hit, 0 for every miss and -1 for every game
+        that was over already or in which the target was already targeted.
+        Retargeted points are left alone, same as Board.check_hit raising a
+        ValueError.
+        """
+        games = np.arange(len(self))
+        rows, columns = targets[:, 0], targets[:, 1]
+
+        is_ship = self.ships[games, rows, columns]
+        targeted = self.hits[games, rows, columns] | \
+            self.misses[games, rows, columns]
+        valid = ~targeted & ~self.is_over()
+
+        hit = valid & is_ship
+        miss = valid & ~is_ship
+
+        self.hits[games[hit], rows[hit], columns[hit]] = True
+        self.misses[games[miss], rows[miss], columns[miss]] = True
+        self.ship_count -= hit
+
+        return np.where(valid, hit.astype(np.int64), -1)
+
+    def random_targets(self, rng):
+        """
+        Returns a random point per game out of the ones not targeted yet.
+        """
+        games = len(self)
+        untargeted = ~(self.hits | self.misses).reshape(games, 64)
+        keys = rng.random(untargeted.shape)
+        keys[~untargeted] = -1
+        points = keys.argmax(axis=1)
+        return np.stack(np.divmod(points, 8), axis=1)
+
+    def to_board(self, game, engine=None):
+        """
+        Returns a Board in the same state as the board of the given game.
+        """
+        engine = engine if engine else board_engine
+        board = engine(fleet=self.fleet)
+        for row, column in zip(*np.nonzero(self.ships[game])):
+            board.update_point((int(row), int(column)), "ship")
+        for row, column in zip(*np.nonzero(self.hits[game])):
+            board.update_point((int(row), int(column)), "hit")
+        for row, column in zip(*np.nonzero(self.misses[game])):
+            board.update_point((int(row), int(column)), "miss")
+        return board
+
+
+def simulate(games, seed=0):
+    """
+    Sinks the fleets of the given number of games with random targeting.
+
+    Returns the number of shots each game took and the games per second.
+    """
+    rng = np.random.default_rng(seed)
+
+    start = perf_counter()
+    batch = BatchBoards(games)
+    batch.place_randomly(rng)
+    shots = np.zeros(games, dtype=np.int64)
+    while not batch.is_over().all():
+        shots += batch.fire(batch.random_targets(rng)) >= 0
+    elapsed = perf_counter() - start
+
+    return shots, games / elapsed
+
+
+if __name__ == "__main__":
+    games = int(argv[1]) if len(argv) > 1 else 100000
+    shots, rate = simulate(games)
+    print(f"{games} games: {shots.mean():.1f} mean shots to sink the fleet "
+          f"({rate:.0f} games per second)")
@@ -0,0 +1,436 @@
+"""
+Web terminal load test.
+
+Opens simulated visitors against the web terminal (index.js) running
+locally, each a websocket client playing a scripted game the way a user
+would: it reads the frames the game draws on a screen of its own, and
+whenever a frame ends with the enter sign (⏎) or the input arrow (====>)
+it types enter or the next line of its script, one keystroke per message,
+same as the browser terminal sends them.
+
+The visitors are started in rounds of more and more at once, e.g. 1, 2,
+4, 8, and every round reports the percentiles of the time from the last
+keystroke of a line to the next frame being drawn, until the 99th
+percentile goes over the limit, which gives the number of visitors the
+host can take before they notice. Given the process IDs of the web
+terminal (and of the zygote or game server, if one is used), every round
+also reports how much memory the processes and their children take per
+visitor at the busiest point of the round, both resident (RSS) and
+proportional (PSS). Forked games share the pages of the process they were
+forked from, which RSS counts once per process, so PSS, which splits every
+shared page between the processes sharing it, is the one to go by.
+
+The scripts are the ones scripted.py generates, so a seed gives the same
+games every time.
+"""
+import argparse
+import asyncio
+import base64
+import codecs
+import hashlib
+import os
+import random
+import re
+import struct
+import sys
+from time import perf_counter
+from urllib.parse import urlsplit
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from scripted import generate_script, separator  # noqa: E402
+from stats import percentile  # noqa: E402
+
+# appended to the key of the handshake to get the accept value, RFC 6455
+websocket_guid = "258EAFA5-E914-47A5-95CA-C5AB0DC11B65"
+
+# the control sequences the game writes, with their parameters
+control_sequence = re.compile(r"\x1b\[([0-9;]*)([A-Za-z])")
+
+
+class Screen():
+    """
+    Initializes a screen:
+
+    Keeps the characters on an 80 by 24 terminal up to date with the output
+    of the game, handling the control sequences the game writes, so the
+    frame on display can be read off it.
+    """
+
+    columns = 80
+    rows = 24
+
+    def __init__(self):
+        self.lines = [[] for _ in range(self.rows)]
+        self.row = 0
+        self.column = 0
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        # an incomplete control sequence at the end of the last output
+        self.pending = ""
+
+    def feed(self, data):
+        """
+        Applies the output to the screen.
+        """
+        text = self.pending + self.decoder.decode(data)
+        self.pending = ""
+        position = 0
+        while position < len(text):
+            escape = text.find("\x1b", position)
+            if escape == -1:
+                escape = len(text)
+            self.put(text[position:escape])
+            if escape == len(text):
+                break
+
+            match = control_sequence.match(text, escape)
+            if match is None:
+                # kept until the rest of the sequence arrives
+                self.pending = text[escape:]
+                break
+            self.control(match.group(1), match.group(2))
+            position = match.end()
+
+    def put(self, text):
+        """
+        Writes the text at the cursor.
+        """
+        for char in text:
+            if char == "\r":
+                self.column = 0
+            elif char == "\n":
+                self.row += 1
+                if self.row == self.rows:
+                    self.lines = self.lines[1:] + [[]]
+                    self.row -= 1
+            elif char == "\b":
+                self.column = max(0, self.column - 1)
+            elif self.column < self.columns:
+                line = self.lines[self.row]
+                line.extend(" " * (self.column + 1 - len(line)))
+                line[self.column] = char
+                self.column += 1
+
+    def control(self, parameters, command):
+        """
+        Carries out a control sequence.
+        """
+        if command == "H":
+            numbers = [int(number) if number else 1
+                       for number in parameters.split(";")]
+            numbers += [1] * (2 - len(numbers))
+            self.row = min(numbers[0], self.rows) - 1
+            self.column = min(numbers[1], self.columns) - 1
+        elif command == "J":
+            if parameters in ("2", "3"):
+                self.lines = [[] for _ in range(self.rows)]
+            else:
+                del self.lines[self.row][self.column:]
+                for row in range(self.row + 1, self.rows):
+                    self.lines[row] = []
+        elif command == "K":
+            del self.lines[self.row][self.column:]
+
+    def prompt(self):
+        """
+        Returns "input" if the line above the cursor is the input arrow,
+        "enter" if it is the enter sign or asks to press enter, or None.
+        """
+        if self.row == 0:
+            return None
+        line = "".join(self.lines[self.row - 1]).strip()
+        if line == "====>":
+            return "input"
+        if line == "⏎" or line.startswith("PRESS ENTER"):
+            return "enter"
+        return None
+
+
+class WebSocket():
+    """
+    Initializes a websocket client connection:
+
+    Speaks just enough of RFC 6455 to exchange messages with the web
+    terminal, without any packages beyond the standard library.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url):
+        """
+        Opens a connection to the URL and returns it once the handshake is
+        done.
+
+        Raises a ConnectionError if the server does not accept it.
+        """
+        parts = urlsplit(url)
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, parts.port or 80)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(
+            f"GET {parts.path or '/'} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            f"Upgrade: websocket\r\n"
+            f"Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            f"Sec-WebSocket-Version: 13\r\n\r\n".encode())
+
+        response = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        accept = base64.b64encode(hashlib.sha1(
+            (key + websocket_guid).encode()).digest()).decode()
+        if " 101 " not in response.split("\r\n")[0] or \
+                accept not in response:
+            writer.close()
+            raise ConnectionError(
+                f"{url} refused the websocket: {response.splitlines()[0]}")
+        return cls(reader, writer)
+
+    def send(self, text, opcode=1):
+        """
+        Sends the text as a single masked message.
+        """
+        payload = text.encode() if isinstance(text, str) else text
+        if len(payload) < 126:
+            header = struct.pack("!BB", 0x80 | opcode, 0x80 | len(payload))
+        elif len(payload) < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126,
+                                 len(payload))
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127,
+                                 len(payload))
+        mask = os.urandom(4)
+        self.writer.write(header + mask + bytes(
+            byte ^ mask[idx % 4] for idx, byte in enumerate(payload)))
+
+    async def receive(self):
+        """
+        Returns the payload of the next data message, or None once the
+        connection is closed. Answers pings on the way.
+        """
+        while True:
+            try:
+                first, second = await self.reader.readexactly(2)
+            except asyncio.IncompleteReadError:
+                return None
+            length = second & 0x7f
+            if length == 126:
+                length, = struct.unpack(
+                    "!H", await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack(
+                    "!Q", await self.reader.readexactly(8))
+            mask = await self.reader.readexactly(4) if second & 0x80 \
+                else None
+            payload = await self.reader.readexactly(length)
+            if mask:
+                payload = bytes(byte ^ mask[idx % 4]
+                                for idx, byte in enumerate(payload))
+
+            opcode = first & 0x0f
+            if opcode == 8:
+                return None
+            if opcode == 9:
+                self.send(payload, opcode=10)
+            elif opcode in (0, 1, 2):
+                return payload
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        self.writer.close()
+
+
+async def visit(url, lines, games, think, latencies):
+    """
+    Plays the games of the script as one visitor, adding the time from the
+    last keystroke of every line to the next frame to the latencies.
+    """
+    socket = await WebSocket.connect(url)
+    screen = Screen()
+    lines = iter([line.rstrip("\n") for line in lines])
+    played = 0
+    sent = None
+    echoed = False
+    try:
+        while True:
+            data = await socket.receive()
+            if data is None:
+                raise ConnectionError("The web terminal closed the session.")
+            screen.feed(data)
+            # until the enter typed last is echoed, moving the cursor down,
+            # the cursor is still below the frame it answered
+            echoed = echoed or b"\n" in data
+            if sent is not None and not echoed:
+                continue
+            prompt = screen.prompt()
+            if prompt is None:
+                continue
+            if sent is not None:
+                latencies.append(perf_counter() - sent)
+                sent = None
+
+            if "PLAY AGAIN" in "".join(screen.lines[screen.row - 1]):
+                played += 1
+                if played == games:
+                    return
+                # the rest of the script of the game is not needed
+                while next(lines) != separator:
+                    pass
+
+            if think:
+                await asyncio.sleep(think)
+            line = next(lines) if prompt == "input" else ""
+            for key in line:
+                socket.send(key)
+            socket.send("\r")
+            sent = perf_counter()
+            echoed = False
+    finally:
+        socket.close()
+
+
+def process_pss(pid):
+    """
+    Returns the proportional memory of the process in bytes, reading
+    /proc/<pid>/smaps_rollup, or /proc/<pid>/smaps on kernels older than
+    4.14, which lack it.
+    """
+    for name in ["smaps_rollup", "smaps"]:
+        try:
+            with open(f"/proc/{pid}/{name}") as file:
+                return sum(int(line.split()[1]) for line in file
+                           if line.startswith("Pss:")) * 1024
+        except FileNotFoundError:
+            continue
+    raise OSError(f"No memory maps for process {pid}.")
+
+
+def process_tree_memory(pids):
+    """
+    Returns the resident and the proportional memory of the processes and
+    all their descendants in bytes, reading /proc.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                # the parent follows the command name, which may hold spaces
+                parent = int(file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    rss = pss = 0
+    queue = list(pids)
+    while queue:
+        pid = queue.pop()
+        queue.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/statm") as file:
+                resident = int(file.read().split()[1]) * os.sysconf(
+                    "SC_PAGE_SIZE")
+            proportional = process_pss(pid)
+        except OSError:
+            continue
+        rss += resident
+        pss += proportional
+    return rss, pss
+
+
+async def run_round(url, visitors, games, think, pids, seed):
+    """
+    Starts the visitors at once and waits for all of them to finish.
+
+    Returns the sorted latencies, the number of visitors that failed and
+    the most resident and proportional memory the processes took while
+    they played.
+    """
+    latencies = []
+    random.seed(seed)
+    scripts = [generate_script(games) for _ in range(visitors)]
+    tasks = [asyncio.ensure_future(visit(url, script, games, think,
+                                         latencies))
+             for script in scripts]
+
+    peak = (0, 0)
+    while not all(task.done() for task in tasks):
+        if pids:
+            peak = tuple(map(max, peak, process_tree_memory(pids)))
+        await asyncio.wait(tasks, timeout=0.1)
+
+    failed = 0
+    for task in tasks:
+        if task.exception() is not None:
+            failed += 1
+            print(f"  a visitor failed: {task.exception()}")
+    return sorted(latencies), failed, peak
+
+
+def main():
+    """
+    Runs the load test from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-u", "--url", default="ws://127.0.0.1:8000/")
+    parser.add_argument("-v", "--visitors", default="1,2,4,8,16,32",
+                        help="comma-separated visitors per round")
+    parser.add_argument("-g", "--games", type=int, default=1,
+                        help="games every visitor plays")
+    parser.add_argument("-t", "--think", type=float, default=0,
+                        help="seconds a visitor waits before typing")
+    parser.add_argument("-l", "--limit", type=float, default=100,
+                        help="99th percentile in milliseconds above which "
+                        "the rounds stop")
+    parser.add_argument("-p", "--pid", type=int, action="append",
+                        default=[], help="process to measure the memory of, "
+                        "along with its children")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    baseline = process_tree_memory(args.pid) if args.pid else (0, 0)
+    if args.pid:
+        print(f"idle: {baseline[0] / 2 ** 20:.1f} MiB RSS, "
+              f"{baseline[1] / 2 ** 20:.1f} MiB PSS")
+
+    capacity = 0
+    for visitors in [int(number) for number in args.visitors.split(",")]:
+        start = perf_counter()
+        latencies, failed, peak = asyncio.run(run_round(
+            args.url, visitors, args.games, args.think, args.pid,
+            args.seed))
+        elapsed = perf_counter() - start
+        if not latencies:
+            print(f"{visitors:4} visitors: no frames received")
+            break
+
+        line = f"{visitors:4} visitors: " + ", ".join(
+            f"p{percent} {percentile(latencies, percent) * 1000:.1f} ms"
+            for percent in [50, 90, 99]) + \
+            f", {len(latencies) / elapsed:.0f} frames per second"
+        if args.pid:
+            rss, pss = [(used - idle) / visitors / 2 ** 20
+                        for used, idle in zip(peak, baseline)]
+            line += f", {rss:.1f} MiB RSS and {pss:.1f} MiB PSS per visitor"
+        if failed:
+            line += f", {failed} failed"
+        print(line, flush=True)
+
+        if percentile(latencies, 99) * 1000 > args.limit or failed:
+            print(f"{capacity} visitors at once before the 99th percentile "
+                  f"went over {args.limit:.0f} ms")
+            break
+        capacity = visitors
+    else:
+        print(f"The 99th percentile stayed under {args.limit:.0f} ms up to "
+              f"{capacity} visitors at once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Startup benchmark.
+
+Measures the time from launching `python3 run.py` to the first frame, the
+start screen, being written to the terminal. The web terminal launches a
+new process per visitor, so every visitor waits this long before seeing
+anything.
+
+The start-up time of a bare interpreter is measured as well for reference,
+and with --zygote so is the time to the first frame when handing the
+terminal over to a running zygote (see zygote.py).
+"""
+import argparse
+import os
+import subprocess
+import sys
+from statistics import median
+from time import perf_counter
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_to_output(command, marker):
+    """
+    Launches the command and returns the seconds it took until the marker
+    was written to its standard output.
+    """
+    start = perf_counter()
+    process = subprocess.Popen(command, cwd=root, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    output = b""
+    try:
+        while marker not in output:
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError(
+                    f"{' '.join(command)} exited before writing {marker}")
+            output += chunk
+        return perf_counter() - start
+    finally:
+        process.stdin.close()
+        process.kill()
+        process.wait()
+
+
+def report(name, times):
+    """
+    Prints the median, fastest and slowest of the times in milliseconds.
+    """
+    print(f"{name}: median {median(times) * 1000:.1f} ms, "
+          f"min {min(times) * 1000:.1f} ms, max {max(times) * 1000:.1f} ms")
+
+
+def main():
+    """
+    Runs the benchmark from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--runs", type=int, default=20)
+    parser.add_argument("--zygote", action="store_true",
+                        help="also time connecting to a running zygote")
+    args = parser.parse_args()
+
+    interpreter = [time_to_output([sys.executable, "-c", "print('ready')"],
+                                  b"ready") for _ in range(args.runs)]
+    first_frame = [time_to_output([sys.executable, "run.py"],
+                                  b"PRESS ENTER TO BEGIN")
+                   for _ in range(args.runs)]
+
+    report("bare interpreter", interpreter)
+    report("first frame", first_frame)
+
+    if args.zygote:
+        zygote = [time_to_output([sys.executable, "zygote.py", "connect"],
+                                 b"PRESS ENTER TO BEGIN")
+                  for _ in range(args.runs)]
+        report("first frame from zygote", zygote)
+
+
+if __name__ == "__main__":
+    main()
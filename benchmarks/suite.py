@@ -0,0 +1,355 @@
+"""
+Benchmark suite.
+
+Times the hot paths of the game one operation at a time, together with
+placing a fleet and playing a full computer vs computer game, and writes
+the results to a JSON file so runs can be compared across commits.
+
+Every benchmark sets up a fresh board from a fixed seed before it is timed,
+so runs of the same commit measure the same work. Each benchmark is run in
+several rounds, with enough operations per round for it to take a while,
+and the median round, taken by nearest rank, is reported. The garbage
+collector is paused while timing, same as timeit does.
+
+The boards use the engine set by BATTLESHIP_ENGINE.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from time import perf_counter, strftime
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from game import (board_engine, parse_input,  # noqa: E402
+                  place_ships_randomly, computer_choose_target)
+from engine import Game  # noqa: E402
+from run import Session, place_ships  # noqa: E402
+from stats import percentile  # noqa: E402
+
+# number of calls per round of the benchmarks of side effect free calls,
+# which are too quick to time one by one
+calls = 1000
+
+
+def mid_game_board():
+    """
+    Returns a board with a fleet placed and the computer halfway through
+    sinking it, with a chain of hits left to follow.
+    """
+    board = board_engine()
+    place_ships_randomly(board)
+    while True:
+        if board.ship_count <= 8 and board.chain_ends:
+            # drops the chain ends that were ruled out already, so choosing
+            # a target leaves the board as it is
+            computer_choose_target(board, "chains")
+            if board.chain_ends:
+                return board
+        try:
+            board.check_hit(computer_choose_target(board, "chains"))
+        except ValueError:
+            continue
+
+
+def free_start(board, ship):
+    """
+    Returns a random starting square the ship can be placed from and the
+    directions it can be placed in.
+    """
+    free = [(row, column) for row in range(8) for column in range(8)
+            if board.get_point((row, column)) == "unmarked"]
+    while True:
+        start_square = random.choice(free)
+        try:
+            return start_square, board.find_legitimate_directions(
+                start_square, ship)
+        except ValueError:
+            continue
+
+
+def repeat(function, *args):
+    """
+    Returns a run calling the function with the arguments a number of
+    times, and that number.
+    """
+    def run():
+        for _ in range(calls):
+            function(*args)
+    return run, calls
+
+
+def bench_parse_input():
+    """
+    Parses a square entered with spaces and in lower case.
+    """
+    return repeat(parse_input, " b 7 ")
+
+
+def bench_find_legitimate_directions():
+    """
+    Finds the directions a destroyer can be placed in from a free square of
+    a board with a fleet placed.
+    """
+    board = board_engine()
+    place_ships_randomly(board)
+    start_square, _ = free_start(board, "destroyer")
+    return repeat(board.find_legitimate_directions, start_square,
+                  "destroyer")
+
+
+def bench_implement_direction():
+    """
+    Places the last ship of the fleet, with the orientation help shown, as
+    when the user places the destroyer.
+    """
+    layout = place_ships_randomly(board_engine())
+    board = board_engine()
+    for ship, start_square, direction in layout[:-1]:
+        board.implement_direction(start_square, direction, [direction], ship)
+
+    start_square, legit_dirs = free_start(board, "destroyer")
+    board.show_directions(start_square, legit_dirs, "destroyer")
+
+    def run():
+        board.implement_direction(
+            start_square, legit_dirs[0], legit_dirs, "destroyer")
+    return run, 1
+
+
+def bench_update_chains():
+    """
+    Updates the chains after a hit, for hits on every ship point of a board
+    in random order.
+    """
+    board = board_engine()
+    place_ships_randomly(board)
+    board.track_chains = False
+    targets = [(row, column) for row in range(8) for column in range(8)
+               if board.get_point((row, column)) == "ship"]
+    random.shuffle(targets)
+    for target in targets:
+        board.update_point(target, "hit")
+
+    def run():
+        for target in targets:
+            board.update_chains(target)
+    return run, len(targets)
+
+
+def bench_computer_choose_target_random():
+    """
+    Chooses a target on a board without any hits.
+    """
+    return repeat(computer_choose_target, board_engine(), "chains")
+
+
+def bench_computer_choose_target_chain():
+    """
+    Chooses a target following a chain of hits.
+    """
+    return repeat(computer_choose_target, mid_game_board(), "chains")
+
+
+def bench_computer_choose_target_density():
+    """
+    Chooses a target from the heat map of a board halfway through a game.
+    """
+    board = mid_game_board()
+    # sets up the heat map, which is kept up to date from then on
+    computer_choose_target(board, "density")
+    return repeat(computer_choose_target, board, "density")
+
+
+def bench_display_board():
+    """
+    Renders a board halfway through a game from scratch.
+    """
+    return repeat(mid_game_board().display_board)
+
+
+def bench_display_rows():
+    """
+    Renders a board halfway through a game after a change to a single row,
+    as display_screen does after a shot.
+    """
+    board = mid_game_board()
+    board.display_rows()
+
+    def run():
+        board.touch(3)
+        board.display_rows()
+    return run, 1
+
+
+def bench_place_ships():
+    """
+    Places the computer's fleet through place_ships.
+    """
+    session = Session()
+
+    def run():
+        try:
+            place_ships(session, user=False, test=True).send(None)
+        except StopIteration:
+            pass
+    return run, 1
+
+
+def bench_full_game():
+    """
+    Places both fleets and plays a computer vs computer game through.
+    """
+    game = Game(modes={"user": "chains", "computer": "chains"})
+
+    def run():
+        game.place_fleet("user")
+        game.place_fleet("computer")
+        game.play()
+    return run, 1
+
+
+benchmarks = {
+    "parse_input": bench_parse_input,
+    "find_legitimate_directions": bench_find_legitimate_directions,
+    "implement_direction": bench_implement_direction,
+    "update_chains": bench_update_chains,
+    "computer_choose_target random": bench_computer_choose_target_random,
+    "computer_choose_target chain": bench_computer_choose_target_chain,
+    "computer_choose_target density": bench_computer_choose_target_density,
+    "display_board": bench_display_board,
+    "display_rows": bench_display_rows,
+    "place_ships": bench_place_ships,
+    "full game": bench_full_game,
+}
+
+
+def time_round(setup, runs, seed):
+    """
+    Sets up and times the given number of runs of a benchmark.
+
+    Returns the seconds spent in the runs and the number of operations.
+    """
+    elapsed = 0
+    operations = 0
+    for number in range(runs):
+        random.seed(seed + number)
+        run, ops = setup()
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = perf_counter()
+            run()
+            elapsed += perf_counter() - start
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        operations += ops
+    return elapsed, operations
+
+
+def measure(setup, rounds, round_time, seed):
+    """
+    Times the benchmark in rounds of at least the given number of seconds.
+
+    Returns the median, fastest and slowest time per operation in
+    microseconds, along with the runs and operations per round.
+    """
+    # doubles the runs per round until a round takes long enough
+    runs = 1
+    while True:
+        elapsed, operations = time_round(setup, runs, seed)
+        if elapsed >= round_time:
+            break
+        runs *= 2
+
+    times = []
+    for _ in range(rounds):
+        elapsed, operations = time_round(setup, runs, seed)
+        times.append(elapsed / operations * 1e6)
+    times.sort()
+
+    return {
+        "median_us": percentile(times, 50),
+        "min_us": times[0],
+        "max_us": times[-1],
+        "runs": runs,
+        "operations": operations
+    }
+
+
+def commit():
+    """
+    Returns the commit checked out, or None outside a git repository.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """
+    Runs the benchmarks from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("names", nargs="*", metavar="benchmark",
+                        help="benchmarks to run, all of them by default")
+    parser.add_argument("-r", "--rounds", type=int, default=7)
+    parser.add_argument("-t", "--round-time", type=float, default=0.1,
+                        help="minimum seconds per round")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-o", "--output",
+                        default=os.path.join(root, "benchmarks",
+                                             "results.json"),
+                        help="file to write the results to")
+    parser.add_argument("-c", "--compare",
+                        help="results file of an earlier run to compare to")
+    args = parser.parse_args()
+
+    names = args.names if args.names else list(benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            parser.error(f"unknown benchmark {name}, pick from "
+                         f"{', '.join(benchmarks)}")
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)["benchmarks"]
+
+    results = {
+        "commit": commit(),
+        "date": strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "engine": board_engine.__name__,
+        "seed": args.seed,
+        "benchmarks": {}
+    }
+
+    for name in names:
+        result = measure(benchmarks[name], args.rounds, args.round_time,
+                         args.seed)
+        results["benchmarks"][name] = result
+
+        line = f"{name:32} {result['median_us']:12.2f} µs " \
+            f"(min {result['min_us']:.2f}, max {result['max_us']:.2f})"
+        if name in previous:
+            ratio = result["median_us"] / previous[name]["median_us"]
+            line += f"  {ratio:.2f}x the earlier run"
+        print(line, flush=True)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Broadcasts of a game to spectators.
+
+A game played on the game server can be watched by any number of
+read-only spectators. Every frame the game draws is turned into bytes once,
+both as the changes from the frame before, same as the player is sent, and
+as a redraw of the whole screen, and the same bytes are handed to every
+spectator, so drawing a frame takes the player as long however many are
+watching.
+
+Every spectator has a buffer of its own, holding as many frames as the
+SPECTATOR_BUFFER environment variable says, which a task of its own sends
+on as fast as the connection takes them. Spectators keeping up are sent
+the changes. Once the buffer of a slow spectator is full, the frames in it
+are dropped for a redraw of the whole screen, which catches it up with the
+game at once, so the game never waits for a spectator and the buffers
+never grow.
+
+Frames are only turned into bytes while somebody is watching, and the
+redraw only when a spectator needs one, so games nobody watches, which are
+most of them, only keep their last frame as it is.
+"""
+import asyncio
+import os
+from collections import deque
+
+from run import Session, screen_changes
+
+buffer_size = int(os.environ.get("SPECTATOR_BUFFER", 8))
+
+# every frame clears the screen first, same as Session.clear
+clear_screen = "\x1b[H\x1b[2J\x1b[3J"
+
+
+def get_redraw(frame):
+    """
+    Returns the bytes that redraw the whole screen with the frame.
+    """
+    return (clear_screen + frame).replace("\n", "\r\n").encode()
+
+
+class Viewer():
+    """
+    Initializes a viewer:
+
+    The frames a spectator is yet to be sent, up to the size of its
+    buffer, each as the changes from the frame before it unless it redraws
+    the whole screen.
+    """
+
+    def __init__(self, size=None):
+        self.size = size if size else buffer_size
+        self.frames = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, changes):
+        """
+        Adds the changes of a frame to the buffer without waiting for
+        anything.
+
+        Returns False, leaving the buffer as it is, if it is full.
+        """
+        if len(self.frames) >= self.size:
+            return False
+        self.frames.append(changes)
+        self.ready.set()
+        return True
+
+    def catch_up(self, redraw):
+        """
+        Drops the frames in the buffer for the redraw of the whole screen.
+        """
+        self.dropped += len(self.frames)
+        self.frames.clear()
+        self.frames.append(redraw)
+        self.ready.set()
+
+    def close(self):
+        """
+        Lets the frames left in the buffer be sent and then ends the viewer.
+        """
+        self.closed = True
+        self.ready.set()
+
+    async def send_to(self, writer):
+        """
+        Sends the frames to the spectator as they come in, each only once
+        the connection took the previous one, until the viewer is closed.
+        """
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.frames:
+                writer.write(self.frames.popleft())
+                self.sent += 1
+                await writer.drain()
+            if self.closed:
+                return
+
+
+class Broadcast():
+    """
+    Initializes a broadcast:
+
+    The viewers of a game, the frame on display, which new viewers are sent
+    a redraw of straight away instead of waiting for the next frame, and
+    the screen the viewers are shown.
+    """
+
+    def __init__(self):
+        self.viewers = set()
+        self.frame = None
+        self.screen = None
+        self.frames = 0
+
+    def publish(self, frame):
+        """
+        Hands the frame, given as text ending in a newline, to every viewer.
+        """
+        self.frame = frame
+        self.frames += 1
+        if not self.viewers:
+            return
+
+        lines = frame.split("\n")[:-1]
+        if self.screen is None or len(lines) >= Session.terminal_rows:
+            changes = get_redraw(frame)
+        else:
+            changes = screen_changes(self.screen, lines).encode()
+        self.screen = lines if len(lines) < Session.terminal_rows else None
+
+        behind = [viewer for viewer in self.viewers
+                  if not viewer.push(changes)]
+        # the redraw is only built once a viewer has fallen behind
+        if behind:
+            redraw = get_redraw(frame)
+            for viewer in behind:
+                viewer.catch_up(redraw)
+
+    def subscribe(self, size=None):
+        """
+        Returns a new viewer of the broadcast, with a buffer of the given
+        size or the one set for every viewer.
+        """
+        viewer = Viewer(size)
+        if self.frame is not None:
+            viewer.catch_up(get_redraw(self.frame))
+            # the frames published while nobody was watching were not
+            # tracked, so the viewers start from the frame on display
+            lines = self.frame.split("\n")[:-1]
+            self.screen = lines if len(lines) < Session.terminal_rows \
+                else None
+        self.viewers.add(viewer)
+        return viewer
+
+    def unsubscribe(self, viewer):
+        """
+        Stops handing frames to the viewer.
+        """
+        self.viewers.discard(viewer)
+
+    def close(self):
+        """
+        Closes every viewer once the game is over.
+        """
+        for viewer in self.viewers:
+            viewer.close()
+        self.viewers.clear()
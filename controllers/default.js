@@ -1,10 +1,13 @@
 const Pty = require('node-pty');
 const fs = require('fs');
+const net = require('net');
 
 exports.install = function () {
 
     ROUTE('/');
     WEBSOCKET('/', socket, ['raw']);
+    ROUTE('/watch/', 'index');
+    WEBSOCKET('/watch/', spectate, ['raw']);
 
 };
 
@@ -15,14 +18,19 @@ function socket() {
 
     this.on('open', function (client) {
 
-        // Spawn terminal
-        client.tty = Pty.spawn('python3', ['run.py'], {
-            name: 'xterm-color',
-            cols: 80,
-            rows: 24,
-            cwd: process.env.PWD,
-            env: process.env
-        });
+        // Connect to the game server if one is running, otherwise
+        // spawn terminal, handing it over to a pre-forked game process if
+        // a zygote is running
+        client.tty = process.env.GAME_SERVER_PORT
+            ? connectToServer(parseInt(process.env.GAME_SERVER_PORT))
+            : Pty.spawn('python3', process.env.ZYGOTE_SOCKET
+                ? ['zygote.py', 'connect'] : ['run.py'], {
+                name: 'xterm-color',
+                cols: 80,
+                rows: 24,
+                cwd: process.env.PWD,
+                env: process.env
+            });
 
         client.tty.on('exit', function (code, signal) {
             client.tty = null;
@@ -49,6 +57,62 @@ function socket() {
     });
 }
 
+// Shows a game being played on the game server, the one given by
+// ?game= or else the one started last, without passing on any keys
+function spectate() {
+
+    this.encodedecode = false;
+    this.autodestroy();
+
+    this.on('open', function (client) {
+
+        if (!process.env.SPECTATOR_PORT) {
+            client.close();
+            return;
+        }
+
+        client.tty = connectToServer(parseInt(process.env.SPECTATOR_PORT));
+        client.tty.write((client.query.game || '') + '\n');
+
+        client.tty.on('exit', function () {
+            client.tty = null;
+            client.close();
+        });
+
+        client.tty.on('data', function (data) {
+            client.send(data);
+        });
+
+    });
+
+    this.on('close', function (client) {
+        if (client.tty) {
+            client.tty.kill();
+            client.tty = null;
+        }
+    });
+}
+
+// Wraps a connection to the game server (server.py) so it can be used in
+// place of a terminal
+function connectToServer(port) {
+    const connection = net.connect(port, '127.0.0.1');
+
+    connection.on('close', function () {
+        connection.emit('exit');
+    });
+
+    connection.on('error', function (err) {
+        console.log('Game server connection error: ', err);
+    });
+
+    connection.kill = function () {
+        connection.destroy();
+    };
+
+    return connection;
+}
+
 if (process.env.CREDS != null) {
     console.log("Creating creds.json file.");
     fs.writeFile('creds.json', process.env.CREDS, 'utf8', function (err) {
@@ -0,0 +1,423 @@
+"""
+Exact endgame solver.
+
+Late in a game, only a few layouts of the user's fleet fit the hits and
+misses on the board. The solver enumerates all of them and works out, by
+trying every shot against every layout, the shot that leaves the fewest
+shots to sink the whole fleet on average, counting every layout as equally
+likely. Positions with more than a few dozen layouts are left to the
+targeting mode, as are the ones that take the search through more
+positions than the BATTLESHIP_SOLVER_POSITIONS environment variable says,
+or longer than the time budget of a move, set in seconds by the
+BATTLESHIP_SOLVER_BUDGET environment variable for the montecarlo mode and
+by the BATTLESHIP_SOLVER_DENSITY_BUDGET one for the density mode, whose
+moves otherwise take microseconds.
+
+Most positions are left to the mode before any layout is listed: the ones
+with more than two ships afloat, which nearly always have too many
+layouts, and, as hunting for a ship without a hit to go on takes the
+search through far more positions, the ones with no hits to follow up and
+more than a handful of layouts. Once the search gives up on a board, it is
+only tried again once fewer than half as many layouts are left, as the
+positions of the moves in between take about as long. The limit on positions
+keeps the solver from running long on any machine, and as it does not
+depend on the clock, it cuts a search off at the same point every time
+for the same position and cache, so games can be reproduced from a seed
+once the time budget is lifted, as the tournament runner does.
+
+Sunk ships are left out of the fleet, and their points count as misses.
+Every solved position is kept in a transposition cache keyed by the hits,
+the misses and the remaining fleet, shared by every game of the process,
+so the positions the search passes through again, on later moves of the
+same game or in other sessions, are looked up instead of solved again,
+including the ones solved before a search ran out of time.
+The cache holds up to as many positions as the BATTLESHIP_SOLVER_CACHE
+environment variable says, dropping the least recently used ones after
+that.
+"""
+import os
+from collections import OrderedDict
+from math import comb, inf
+from random import choice
+from time import perf_counter
+
+from game import placement_masks
+
+# layouts a position may have at most to be solved, and a position without
+# hits to follow up
+layout_limit = 32
+hunt_layout_limit = 10
+
+# ships a position may have afloat at most to be solved
+ship_limit = 2
+
+# values closer than this are ties
+tolerance = 1e-9
+
+budget = float(os.environ.get("BATTLESHIP_SOLVER_BUDGET", 0.02))
+density_budget = float(
+    os.environ.get("BATTLESHIP_SOLVER_DENSITY_BUDGET", 0.002))
+
+# positions a search may solve at most, apart from the ones in the cache
+position_limit = int(os.environ.get("BATTLESHIP_SOLVER_POSITIONS", 300))
+
+cache_size = int(os.environ.get("BATTLESHIP_SOLVER_CACHE", 100000))
+
+# placements of ships of a length on boards of a size, all of them and the
+# ones covering each point, keyed by board size and length
+placement_lists = {}
+
+
+class TranspositionCache():
+    """
+    Initializes a transposition cache:
+
+    Holds the value and best shots of solved positions, keyed by the hit
+    mask, the miss mask, the board size and the lengths of the remaining
+    ships, evicting the least recently used position once it is full.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.positions = OrderedDict()
+        self.lookups = 0
+        self.found = 0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def get(self, key):
+        """
+        Returns the solved position, or None if it is not in the cache.
+        """
+        self.lookups += 1
+        solved = self.positions.get(key)
+        if solved is not None:
+            self.found += 1
+            self.positions.move_to_end(key)
+        return solved
+
+    def put(self, key, solved):
+        """
+        Adds the solved position, evicting the least recently used one if
+        the cache is full.
+        """
+        self.positions[key] = solved
+        self.positions.move_to_end(key)
+        if len(self.positions) > self.size:
+            self.positions.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops every position.
+        """
+        self.positions.clear()
+
+
+cache = TranspositionCache(cache_size)
+
+
+def get_placements(size, length):
+    """
+    Returns the masks of the placements of a ship of the given length on
+    boards of the given size, along with the ones covering each point,
+    building them the first time they are needed.
+    """
+    if (size, length) not in placement_lists:
+        masks = placement_masks(size, length)
+        placement_lists[(size, length)] = (masks, [
+            [mask for mask in masks if mask >> point & 1]
+            for point in range(size[0] * size[1])
+        ])
+    return placement_lists[(size, length)]
+
+
+def board_shots(board):
+    """
+    Returns the masks of the hits and the misses on the board, with bit
+    row * width + column standing for the point.
+
+    The points of the sunk ships are counted as misses, as no other ship
+    can go through them and there is nothing left to find there.
+    """
+    masks = board.point_masks()
+    return masks["hit"] & ~masks["sunk"], masks["miss"] | masks["sunk"]
+
+
+def consistent_layouts(hits, misses, size, lengths, limit=layout_limit,
+                       deadline=inf):
+    """
+    Returns the number of layouts of ships of the given lengths that cover
+    every hit and none of the misses, keyed by the points they cover, or
+    None if there are more than the limit.
+
+    Raises a TimeoutError if the deadline passes before they are all found.
+    """
+    placements = [get_placements(size, length) for length in lengths]
+    layouts = {}
+    found = 0
+
+    def place(remaining, occupied, uncovered):
+        nonlocal found
+        if perf_counter() > deadline:
+            raise TimeoutError("The layouts took too long to find.")
+        if uncovered:
+            if sum(lengths[ship] for ship in remaining) < \
+                    bin(uncovered).count("1"):
+                return
+            # the lowest hit not covered yet has to be covered by one of
+            # the ships left, which is placed first
+            point = (uncovered & -uncovered).bit_length() - 1
+            blocked = occupied | misses
+            for ship in remaining:
+                others = [other for other in remaining if other != ship]
+                for mask in placements[ship][1][point]:
+                    if found > limit:
+                        return
+                    if not mask & blocked:
+                        place(others, occupied | mask, uncovered & ~mask)
+            return
+
+        if not remaining:
+            layouts[occupied] = layouts.get(occupied, 0) + 1
+            found += 1
+            return
+
+        # every hit is covered, so the ships left keep off the hits
+        ship = remaining[0]
+        blocked = occupied | misses
+        if len(remaining) == 1:
+            for mask in placements[ship][0]:
+                if not mask & blocked:
+                    layouts[occupied | mask] = \
+                        layouts.get(occupied | mask, 0) + 1
+                    found += 1
+            return
+        for mask in placements[ship][0]:
+            if found > limit:
+                return
+            if not mask & blocked:
+                place(remaining[1:], occupied | mask, 0)
+
+    place(list(range(len(lengths))), 0, hits)
+    return layouts if found <= limit else None
+
+
+class Solver():
+    """
+    Initializes a solver:
+
+    Holds the layouts consistent with a position, the points they cover and
+    how many layouts of the fleet cover those points, and solves the
+    positions that follow from it, with sets of layouts held as masks with
+    a bit per layout.
+
+    Raises a TimeoutError once the deadline passes or it has solved the
+    given number of positions without finishing, leaving the positions
+    solved until then in the cache.
+    """
+
+    def __init__(self, layouts, size, lengths, deadline,
+                 positions=position_limit):
+        self.masks = list(layouts)
+        self.counts = [layouts[mask] for mask in self.masks]
+        self.size = size
+        self.lengths = lengths
+        self.deadline = deadline
+        self.positions_left = positions
+        self.full = (1 << size[0] * size[1]) - 1
+
+        # the layouts covering each point, keyed by the bit of the point
+        self.covering = {}
+        for idx, mask in enumerate(self.masks):
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                self.covering[bit] = self.covering.get(bit, 0) | 1 << idx
+
+    def solve(self, hits, subset, limit=inf):
+        """
+        Returns the average number of shots it takes to sink the fleet
+        when firing the best shots, if it is laid out as one of the subset
+        of the layouts, the mask of those shots and whether the number is
+        exact.
+
+        Positions that take at least the limit are only solved as far as
+        needed to tell, and return a lower bound of at least the limit
+        instead, which is not exact.
+        """
+        union = 0
+        common = -1
+        total = 0
+        remaining = subset
+        while remaining:
+            bit = remaining & -remaining
+            remaining ^= bit
+            idx = bit.bit_length() - 1
+            union |= self.masks[idx]
+            common &= self.masks[idx]
+            total += self.counts[idx]
+
+        # the layouts only depend on the hits and on the points none of
+        # them cover, so those are the misses the position is keyed by,
+        # which lets shots ruling out the same layouts in another order
+        # share it
+        key = (hits, ~union & self.full, self.size, self.lengths)
+        solved = cache.get(key)
+        if solved is not None and (solved[2] or solved[0] >= limit):
+            return solved
+        self.positions_left -= 1
+        if self.positions_left < 0 or perf_counter() > self.deadline:
+            raise TimeoutError("The endgame took too long to solve.")
+
+        # the points every layout covers have to be hit anyway, and firing
+        # at them tells nothing, so they are fired at first
+        certain = common & ~hits
+        if certain:
+            fired = bin(certain).count("1")
+            value, _, exact = self.solve(hits | certain, subset,
+                                         limit - fired)
+            solved = (value + fired, certain, exact)
+        elif union == hits:
+            solved = (0, 0, True)
+        else:
+            solved = self.split(hits, subset, union, total, limit)
+
+        cache.put(key, solved)
+        return solved
+
+    def split(self, hits, subset, union, total, limit):
+        """
+        Tries every shot that splits the subset of the layouts, for
+        solve.
+        """
+        # points covered by the same layouts split them the same way, so
+        # they are only tried once
+        splits = {}
+        uncertain = union & ~hits
+        while uncertain:
+            bit = uncertain & -uncertain
+            uncertain ^= bit
+            covered = subset & self.covering[bit]
+            splits[covered] = splits.get(covered, 0) | bit
+
+        # every point still to hit takes a shot, and of the layouts that
+        # cover different points, only one can be found without missing,
+        # only as many as there are points left to hit with one miss and
+        # so on, which bounds what each split takes from below
+        left = sum(self.lengths) - bin(hits).count("1")
+        candidates = []
+        for covered, bits in splits.items():
+            hit_count, hit_misses = self.count(covered, left - 1)
+            miss_count, miss_misses = self.count(subset & ~covered, left)
+            miss_bound = left + miss_misses / miss_count
+            bound = 1 + (hit_count * (left - 1) + hit_misses +
+                         miss_count * left + miss_misses) / total
+            candidates.append((bound, covered, bits, hit_count, miss_bound))
+        # the most promising splits are tried first, so the rest can be
+        # cut off as soon as their bound is no better than the best so far
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        best_value = inf
+        best = 0
+        for bound, covered, bits, hit_count, miss_bound in candidates:
+            # splits as good as the best one are tried too, as ties are
+            # chosen between randomly
+            cutoff = min(limit, best_value + tolerance)
+            if bound >= cutoff:
+                break
+            miss_count = total - hit_count
+
+            # a hit on any of the points tells the same, so the value after
+            # it is the same for all of them
+            hit_limit = ((cutoff - 1) * total -
+                         miss_count * miss_bound) / hit_count
+            hit_value = self.solve(hits | bits & -bits, covered,
+                                   hit_limit)[0]
+            if hit_value >= hit_limit:
+                continue
+            miss_limit = ((cutoff - 1) * total -
+                          hit_count * hit_value) / miss_count
+            miss_value = self.solve(hits, subset & ~covered, miss_limit)[0]
+            if miss_value >= miss_limit:
+                continue
+
+            value = 1 + (hit_count * hit_value +
+                         miss_count * miss_value) / total
+            if value < best_value - tolerance:
+                best_value, best = value, bits
+            else:
+                best |= bits
+
+        if best_value == inf:
+            return (limit, 0, False)
+        # ties right at the limit may have been cut off
+        return (best_value, best, best_value + tolerance < limit)
+
+    def count(self, subset, left):
+        """
+        Returns the number of layouts of the fleet in the subset, and the
+        fewest misses they can take in total with the given number of
+        points left to hit.
+        """
+        counts = []
+        while subset:
+            bit = subset & -subset
+            subset ^= bit
+            counts.append(self.counts[bit.bit_length() - 1])
+        counts.sort(reverse=True)
+
+        # the most common layouts take the fewest misses, up to as many
+        # layouts per number of misses as there are ways to place the
+        # misses between the hits
+        fewest = 0
+        misses = 0
+        start = 0
+        ways = 1
+        for idx, count in enumerate(counts):
+            while idx >= start + ways:
+                start += ways
+                misses += 1
+                ways = comb(left + misses - 1, misses)
+            fewest += misses * count
+        return sum(counts), fewest
+
+
+def choose_target(board, time_budget=None):
+    """
+    Returns the coordinates of the point that leaves the fewest shots on
+    average, choosing randomly between ties, or None if the position has
+    too many ships afloat or layouts, or takes more positions or longer
+    than the time budget to solve.
+    """
+    if board.placements is None:
+        return None
+    afloat = board.fleet_afloat()
+    if len(afloat) > ship_limit:
+        return None
+
+    deadline = perf_counter() + (budget if time_budget is None
+                                 else time_budget)
+    # the longest ships are placed first, as they have the fewest places,
+    # leaving out the sunk ones
+    lengths = tuple(sorted(afloat.values(), reverse=True))
+    hits, misses = board_shots(board)
+    limit = layout_limit if hits else hunt_layout_limit
+    if board.solver_layouts is not None:
+        limit = min(limit, (board.solver_layouts + 1) // 2 - 1)
+    layouts = None
+    try:
+        layouts = consistent_layouts(hits, misses, board.size, lengths,
+                                     limit, deadline)
+        if layouts is None:
+            return None
+        _, best, _ = Solver(layouts, board.size, lengths, deadline).solve(
+            hits, (1 << len(layouts)) - 1)
+    except TimeoutError:
+        if layouts is not None:
+            board.solver_layouts = len(layouts)
+        return None
+
+    points = [point for point in range(board.height * board.width)
+              if best >> point & 1]
+    return divmod(choice(points), board.width)
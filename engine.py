@@ -0,0 +1,160 @@
+"""
+Headless game engine.
+
+Runs games without any terminal input or output, so the computer can play
+against itself in a tight loop, e.g. to tune its targeting or to check rule
+changes.
+"""
+from sys import argv
+from time import perf_counter
+
+from game import (board_engine, targeting_mode, board_size, SparseBoard,
+                  dense_area_limit, RetargetError, computer_choose_target,
+                  place_ships_randomly)
+
+
+class Game():
+    """
+    Initializes a game:
+
+    Owns a board for each player and keeps track of whose turn it is. The
+    user always goes first, same as in the interactive game.
+
+    Targets chosen by the computer for either player follow the targeting
+    mode set for that player in modes, or the BATTLESHIP_AI mode if none is.
+
+    The boards are of the standard size and hold the standard fleet unless
+    given a (rows, columns) size or a fleet. Boards larger than
+    dense_area_limit points are backed by SparseBoard unless an engine is
+    passed in.
+    """
+
+    def __init__(self, engine=None, modes=None, size=None, fleet=None):
+        size = size if size else board_size
+        if not engine:
+            engine = board_engine if size[0] * size[1] <= dense_area_limit \
+                else SparseBoard
+        self.modes = {"user": targeting_mode, "computer": targeting_mode}
+        if modes:
+            self.modes.update(modes)
+        self.boards = {
+            "user": engine(size=size, fleet=fleet),
+            "computer": engine(user=False, size=size, fleet=fleet)
+        }
+        # both players may be played by the computer, so both boards need
+        # their chains of hits tracked
+        self.boards["computer"].track_chains = True
+
+        self.user_turn = True
+        self.shots = {"user": 0, "computer": 0}
+
+    def place_fleet(self, player, layout=None):
+        """
+        Places the fleet of the player.
+
+        Places the ships randomly if no layout is passed in, otherwise
+        expects a list of (ship, starting square, direction) tuples.
+
+        Raises a ValueError if a ship in the layout cannot be placed.
+        """
+        board = self.boards[player]
+
+        if layout is None:
+            place_ships_randomly(board)
+            return
+
+        for ship, start_square, direction in layout:
+            if ship not in board.fleet:
+                raise ValueError(f"{ship} is not one of the ships.")
+            legit_dirs = board.find_legitimate_directions(start_square, ship)
+            board.implement_direction(
+                start_square, direction, legit_dirs, ship)
+
+    def fire(self, target=None):
+        """
+        Fires at the target on behalf of the player whose turn it is and
+        passes the turn on.
+
+        If no target is passed in, the computer chooses one. Returns the
+        state of the target before it was hit, i.e. "ship" or "unmarked".
+
+        Raises a RetargetError if the target was already targeted, in which
+        case the turn is not passed on.
+        """
+        player = "user" if self.user_turn else "computer"
+        target_board = self.boards["computer" if self.user_turn else "user"]
+
+        if target is None:
+            target = computer_choose_target(target_board, self.modes[player])
+        target = (int(target[0]), int(target[1]))
+
+        target_state = target_board.check_target(target)
+        if target_state == "ship":
+            target_board.update_point(target, "hit")
+        else:
+            target_board.update_point(target, "miss")
+
+        self.shots[player] += 1
+        self.user_turn = not self.user_turn
+
+        return target_state
+
+    def is_over(self):
+        """
+        Returns True once either of the players runs out of ships.
+        """
+        return (self.boards["user"].ship_count == 0 or
+                self.boards["computer"].ship_count == 0)
+
+    def winner(self):
+        """
+        Returns the player who won, or None while the game is running.
+        """
+        if self.boards["computer"].ship_count == 0:
+            return "user"
+        if self.boards["user"].ship_count == 0:
+            return "computer"
+        return None
+
+    def play(self):
+        """
+        Plays the game through with the computer choosing the targets
+        for both players and returns the winner.
+        """
+        while not self.is_over():
+            try:
+                self.fire()
+            # the random choice may land on a point that was already
+            # targeted, in which case the computer just chooses again
+            except RetargetError:
+                continue
+        return self.winner()
+
+
+def self_play(games, modes=None, size=None, fleet=None):
+    """
+    Plays the given number of computer vs computer games, on boards of the
+    given size holding the given fleet if passed in.
+
+    Returns the number of games each player won and the games per second.
+    """
+    wins = {"user": 0, "computer": 0}
+
+    start = perf_counter()
+    for _ in range(games):
+        game = Game(modes=modes, size=size, fleet=fleet)
+        game.place_fleet("user")
+        game.place_fleet("computer")
+        wins[game.play()] += 1
+    elapsed = perf_counter() - start
+
+    return wins, games / elapsed
+
+
+if __name__ == "__main__":
+    games = int(argv[1]) if len(argv) > 1 else 1000
+    # optionally pit two targeting modes against each other
+    modes = {"user": argv[2], "computer": argv[3]} if len(argv) > 3 else None
+    wins, rate = self_play(games, modes)
+    print(f"{games} games: user won {wins['user']}, "
+          f"computer won {wins['computer']} ({rate:.0f} games per second)")
@@ -0,0 +1,1364 @@
+"""
+Core game logic.
+
+Holds the ships, the boards and how the computer places its ships and
+chooses its targets, without any terminal input or output, so it can be
+imported without starting a game. NumPy is only imported by the features
+that are vectorised.
+"""
+from re import findall, sub
+from random import choice, randint, randrange, shuffle
+from time import perf_counter
+import os
+
+ships = {
+    "carrier": 5,
+    "battleship": 4,
+    "cruiser": 3,
+    "submarine": 3,
+    "destroyer": 2
+}
+
+# (row, column) offsets of a single step in each direction
+directions = {
+    "N": (-1, 0),
+    "S": (1, 0),
+    "W": (0, -1),
+    "E": (0, 1)
+}
+
+
+def step(point, direction, distance=1):
+    """
+    Returns the coordinates the given distance away from the point in the
+    given direction, whether or not they are on the board.
+    """
+    return (point[0] + distance * directions[direction][0],
+            point[1] + distance * directions[direction][1])
+
+
+dir_complements = {
+    "N": "S",
+    "S": "N",
+    "W": "E",
+    "E": "W"
+}
+
+# the directions at right angles to each direction
+dir_perpendiculars = {
+    direction: [other for other in directions
+                if other not in (direction, dir_complements[direction])]
+    for direction in directions
+}
+
+direction_aliases = {
+    "U": "N",
+    "D": "S",
+    "L": "W",
+    "R": "E"
+}
+
+messages = {
+    True: {
+        "ship": [
+            "Uff! That one hurt!",
+            "Yikes! Right in my ship!",
+            "Ouch! Hope that wasn't my last one...",
+            "Well, that one fought bravely...\nSank bravely too..."
+        ],
+        "unmarked": [
+            "Not even close! :)",
+            "Miles off! Wrong ocean, even!",
+            "You're making waves!\nOnly in the water, unfortunately. ;)",
+            "Better luck next time.\nWait, why would I want that for you..."
+        ]
+    },
+    False: {
+        "ship": [
+            "Yesss! Gotcha!",
+            "Knew it! One down!",
+            "So that's where you're hiding...",
+            "Almost beat you.\nWait, is that right? I forgot to count."
+        ],
+        "unmarked": [
+            "Oh, nothing there! Well, that's a bummer.",
+            "Damn! Missed completely.",
+            "Uff, gotta focus.",
+            "Aha. So no ship there... Hmmm..."
+        ]
+    }
+}
+
+# added to the message when a shot sinks a ship, keyed the same way
+sunk_messages = {
+    True: "You sank my {ship}!",
+    False: "I sank your {ship}!"
+}
+
+states = {
+    "ship": "■",
+    "orient": "□",
+    "hit": "X",
+    "miss": "O",
+    "unmarked": "·"
+}
+
+columns = [chr(code) for code in range(65, 73)]
+rows = [str(num) for num in range(1, 9)]
+
+# (rows, columns) of the board, unless a game sets up boards of another
+# size, which the terminal interface does not
+board_size = (8, 8)
+
+
+class RetargetError(ValueError):
+    """
+    Raised when a point that was targeted already is targeted again.
+    """
+
+
+class Frontier():
+    """
+    Initializes a frontier:
+
+    The chain ends the computer follows when choosing targets, as a stack
+    of (point, end) tuples, each end pointing in the direction to continue
+    the chain from the point in. The ends still on the stack are listed per
+    point as well, so pushing an end, popping the last one and keeping only
+    the ends of a single point all take constant time, as no point has more
+    than four ends.
+    """
+
+    def __init__(self):
+        self.ends = []
+        self.point_ends = {}
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __iter__(self):
+        return iter(self.ends)
+
+    def push(self, point, end):
+        """
+        Adds a chain end on top of the stack.
+        """
+        self.ends.append((point, end))
+        self.point_ends.setdefault(point, []).append(end)
+
+    def pop(self):
+        """
+        Removes the chain end on top of the stack and returns it.
+        """
+        point, end = self.ends.pop()
+        # the ends of a point are in the same order as on the stack, so the
+        # one on top is the last one of its point
+        point_ends = self.point_ends[point]
+        point_ends.pop()
+        if not point_ends:
+            del self.point_ends[point]
+        return point, end
+
+    def keep_only(self, point, dropped_ends):
+        """
+        Forgets all chain ends but the ones of the point, apart from the
+        dropped ones.
+        """
+        ends = [end for end in self.point_ends.get(point, [])
+                if end not in dropped_ends]
+        self.ends = [(point, end) for end in ends]
+        self.point_ends = {point: ends} if ends else {}
+
+    def drop(self, points):
+        """
+        Forgets all chain ends of the points, e.g. the ones of a ship that
+        was sunk.
+        """
+        dropped = [point for point in points if point in self.point_ends]
+        if not dropped:
+            return
+        for point in dropped:
+            del self.point_ends[point]
+        self.ends = [(point, end) for point, end in self.ends
+                     if point in self.point_ends]
+
+    def next_target(self, board):
+        """
+        Returns the point the chain end on top of the stack leads to, or None
+        once there are no chain ends left.
+
+        Chain ends leading to points that were targeted already or are out
+        of bounds are popped and counted as retargets of the board on the
+        way, so a point is never returned twice.
+        """
+        while self.ends:
+            point, end = self.ends[-1]
+            target = step(point, end)
+            try:
+                if board.get_point(target) not in ["hit", "miss"]:
+                    return target
+            except KeyError:
+                pass
+            self.pop()
+            board.retargets += 1
+        return None
+
+
+class RowCache():
+    """
+    Caches the rows of a board as rendered for display_screen.
+
+    Every change to a board bumps its version and marks the row it was made
+    in with it, so only the rows changed since the last render are rendered
+    again. Boards using the cache implement render_row and have a height.
+
+    Rows only get an entry once they are changed or rendered, so setting up
+    the cache does not take longer the larger the board is.
+    """
+
+    def reset_cache(self):
+        """
+        Sets up an empty cache, with every row in need of rendering.
+        """
+        self.version = 0
+        self.row_versions = {}
+        # a cache per view, the one with ships shown and the one without
+        self.rendered = {
+            view: {"versions": {}, "rows": {}}
+            for view in [True, False]
+        }
+
+    def touch(self, row):
+        """
+        Marks the row as changed.
+        """
+        self.version += 1
+        self.row_versions[row] = self.version
+
+    def display_rows(self, hide_ships=None):
+        """
+        Returns the rows of the board as strings of symbols separated by
+        spaces, hiding the ships if the board belongs to the computer unless
+        told otherwise.
+        """
+        if hide_ships is None:
+            hide_ships = self.computer
+        cache = self.rendered[hide_ships]
+        versions, rendered = cache["versions"], cache["rows"]
+        row_versions = self.row_versions
+
+        for row in range(self.height):
+            version = row_versions.get(row, 0)
+            if versions.get(row, -1) != version:
+                rendered[row] = self.render_row(row, hide_ships)
+                versions[row] = version
+
+        # every row is rendered the first time round, in order, so the rows
+        # are kept in order
+        return list(rendered.values())
+
+
+class BoardBase(RowCache):
+    """
+    Initializes what every board engine holds:
+
+    The size and fleet of the board, the chains of hits the computer follows
+    and the ships placed on it, along with the rules for placing ships,
+    targeting them and following chains of hits, which do not depend on how
+    the points are stored.
+
+    Engines store the points, implementing get_point, set_point,
+    render_row, show_directions and implement_direction, and the chains of
+    every point, implementing get_chains, start_chains and clear_chains.
+    """
+
+    # engines without a placement index set this to False, as the index
+    # takes time and memory per point
+    indexed = True
+
+    def __init__(self, user=True, size=None, fleet=None):
+        self.size = size if size else board_size
+        self.height, self.width = self.size
+        self.fleet = fleet if fleet else ships
+        self.placements = get_placement_index(self.size, self.fleet) \
+            if self.indexed else None
+
+        self.chain_ends = Frontier()
+        self.computer = not user
+        # chains are only tracked on the user's board by default, as only
+        # the computer uses them to choose targets
+        self.track_chains = user
+        # only set up once the computer targets the board in density mode
+        self.heat_map = None
+        # layouts of the position the endgame solver last gave up on
+        self.solver_layouts = None
+        # the previous message is filtered out to avoid repetition
+        self.previous_message = ""
+        # targets the computer chose again as they were targeted already
+        self.retargets = 0
+        self.ship_count = sum(self.fleet.values())
+        # the ship covering each point, the points of each ship and the hits
+        # each ship takes before it sinks, filled in as ships are placed
+        self.ship_at = {}
+        self.ship_points = {}
+        self.hits_left = {}
+        # the ships sunk so far, in the order they sank
+        self.sunk = []
+        self.reset_cache()
+
+    def update_point(self, coordinates, new_state):
+        """
+        Updates the state of a point, reduces the ship count and the hits
+        left of the ship by one if a ship was hit, sinking it once none are
+        left, and updates tracked chains of hits if the user's board was
+        targeted.
+        """
+        point = (int(coordinates[0]), int(coordinates[1]))
+        self.set_point(point, new_state)
+        # the shot is recorded before the ship it sinks
+        if self.heat_map is not None and new_state in ["hit", "miss"]:
+            self.heat_map.record(point, new_state == "hit")
+        if new_state == "hit":
+            self.ship_count -= 1
+            if self.track_chains:
+                self.update_chains(point)
+            ship = self.ship_at.get(point)
+            if ship is not None:
+                self.hits_left[ship] -= 1
+                if not self.hits_left[ship]:
+                    self.sink(ship)
+
+    def sink(self, ship):
+        """
+        Records the ship as sunk and, if chains are tracked, forgets the
+        chains of hits through its points, as there is nothing left to find
+        around them. The heat map, if set up, rules out every placement of
+        the ship and every placement through its points.
+        """
+        self.sunk.append(ship)
+        if self.heat_map is not None:
+            self.heat_map.sink(ship, self.ship_points[ship])
+        if self.track_chains:
+            points = self.ship_points[ship]
+            self.chain_ends.drop(points)
+            for point in points:
+                self.clear_chains(point)
+
+    def fleet_afloat(self):
+        """
+        Returns the lengths of the ships not sunk yet, keyed by the ship.
+        """
+        return {ship: length for ship, length in self.fleet.items()
+                if ship not in self.sunk}
+
+    def sunk_points(self):
+        """
+        Returns the points of the ships sunk so far.
+        """
+        return [point for ship in self.sunk
+                for point in self.ship_points[ship]]
+
+    def state_masks(self):
+        """
+        Returns the mask of every field state but unmarked, keyed by the
+        state, with bit row * width + column standing for the point.
+        """
+        masks = {"ship": 0, "orient": 0, "hit": 0, "miss": 0}
+        for row in range(self.height):
+            for column in range(self.width):
+                state = self.get_point((row, column))
+                if state != "unmarked":
+                    masks[state] |= 1 << (row * self.width + column)
+        return masks
+
+    def point_masks(self):
+        """
+        Returns the masks of state_masks along with the mask of the points
+        of the sunk ships, keyed by "sunk", so the board is scanned once for
+        whatever needs its shots.
+        """
+        masks = self.state_masks()
+        masks["sunk"] = 0
+        for row, column in self.sunk_points():
+            masks["sunk"] |= 1 << (row * self.width + column)
+        return masks
+
+    def find_legitimate_directions(self, starting_square, ship):
+        """
+        Returns legitimate orientations for placing the ships, that do not go
+        out of bounds or intersect an already placed ship.
+        """
+        occupied = self.occupied_mask()
+        start = (int(starting_square[0]), int(starting_square[1]))
+        legit_dirs = []
+
+        # placements going out of bounds are missing from the index
+        for direction, starts in self.placements[self.fleet[ship]].items():
+            mask = starts.get(start, 0)
+            if mask and not mask & occupied:
+                legit_dirs.append(direction)
+
+        if len(legit_dirs) == 0:
+            raise ValueError(
+                "Ship cannot be placed in any orientation from the chosen "
+                "starting position\nwithout overlapping another ship or going"
+                " out of bounds.")
+
+        return legit_dirs
+
+    def check_direction(self, direction, legit_dirs):
+        """
+        Returns the direction entered, with aliases replaced, if it is one
+        of the legitimate directions or C, throws error if not.
+        """
+        direction = direction.upper()
+
+        # warned by sister the cardinal directions may not be user friendly
+        # so added aliases last minute
+        if direction in direction_aliases:
+            direction = direction_aliases[direction]
+
+        if not (direction in legit_dirs or direction == "C"):
+            raise ValueError(
+                f"{direction} is not one of the possible directions.")
+
+        return direction
+
+    def add_ship(self, ship, points):
+        """
+        Records the points of a ship placed on the board.
+        """
+        for point in points:
+            self.ship_at[point] = ship
+        self.ship_points[ship] = points
+        self.hits_left[ship] = len(points)
+
+    def update_chains(self, starting_point):
+        """
+        Updates the info about chains of hits in the user's board
+        after the computer makes its move.
+
+        This info is later used by the computer to decide on its
+        next move.
+        """
+        starting_point = (int(starting_point[0]), int(starting_point[1]))
+        this_chains = self.start_chains(starting_point)
+
+        for direction in directions:
+            next_point = step(starting_point, direction)
+            # if the adjacent point contains a chain end
+            # pointed in the opposite direction to the one we are checking
+            # that is, towards us, we save any such chains as extendable
+            # chains
+            towards = dir_complements[direction]
+            extendable_chain = [chain for chain in self.get_chains(next_point)
+                                if chain["end"] == towards]
+
+            if len(extendable_chain):
+                # due to how the condition is formulated, there will be at
+                # most one match, as any point can be part of at most
+                # 4 chains, and it cannot be the same end for any two
+                this_chains.append(extendable_chain[0].copy())
+
+                # get perpendicular directions to the one we are extending
+                # and remove them from the chain ends
+
+                # this prevents the computer from continuing to choose
+                # targets around its initial target if it already figured
+                # out the orientation of the ship
+                self.chain_ends.keep_only(next_point,
+                                          dir_perpendiculars[direction])
+
+        # if no extendable chains are found, create four chains in all
+        # directions around the point we hit
+
+        # the computer will keep targeting around it until it hits another
+        # spot and will then continue in the same direction
+        if not this_chains:
+            this_chains.extend([
+                {"end": "N"},
+                {"end": "S"},
+                {"end": "W"},
+                {"end": "E"}
+            ])
+            shuffle(this_chains)
+
+        for chain in this_chains:
+            if chain["end"]:
+                self.chain_ends.push(starting_point, chain["end"])
+
+    def check_target(self, target):
+        """
+        Returns the state of the target.
+
+        Raise a RetargetError if user retargets same spot.
+        """
+        target_state = self.get_point(target)
+
+        if target_state in ["hit", "miss"]:
+            raise RetargetError(
+                "You already targeted that spot! Pick another one.")
+
+        return target_state
+
+    def check_hit(self, target):
+        """
+        Check if the target was hit, update the board accordingly.
+
+        Raise error if user retargets same spot.
+        """
+        row, column = target
+
+        target_state = self.check_target((row, column))
+        sunk = len(self.sunk)
+
+        if target_state == "ship":
+            self.update_point((row, column), "hit")
+        elif target_state == "unmarked":
+            self.update_point((row, column), "miss")
+
+        # choose a random message appropriate to the situation
+        # the previous message is filtered out to avoid repetition
+        message = choice(
+            [text for text in messages[self.computer][target_state]
+                if text != self.previous_message])
+
+        self.previous_message = message
+
+        # sinking a ship is announced along with the message
+        if len(self.sunk) > sunk:
+            message += "\n" + sunk_messages[self.computer].format(
+                ship=self.sunk[-1])
+
+        return message
+
+
+class Board(BoardBase):
+    """
+    Initializes a board:
+
+    A dictionary with coordinate tuples as keys, field states as values
+    and methods that allow actions upon the board.
+
+    Holds the standard fleet on a board of the standard size unless it is
+    given a (rows, columns) size or a fleet, with ship names as keys and
+    their lengths as values.
+    """
+
+    def __init__(self, user=True, state=None, size=None, fleet=None):
+        super().__init__(user, size, fleet)
+
+        self.state = state if state else {}
+        self.state.update({(i, j): {"point": "unmarked",
+                                    "chains": [], "is_in_chain": False}
+                           for i in range(self.height)
+                           for j in range(self.width)})
+
+    def get_point(self, coordinates):
+        """
+        Returns the state of a single point.
+
+        Raises a KeyError if the coordinates are out of bounds.
+        """
+        return self.state[(coordinates[0], coordinates[1])]["point"]
+
+    def state_masks(self):
+        """
+        Returns the mask of every field state but unmarked, keyed by the
+        state, going through the points in the dictionary.
+        """
+        masks = {"ship": 0, "orient": 0, "hit": 0, "miss": 0}
+        for (row, column), state in self.state.items():
+            if state["point"] != "unmarked":
+                masks[state["point"]] |= 1 << (row * self.width + column)
+        return masks
+
+    def set_point(self, point, new_state):
+        """
+        Updates the state of the point.
+        """
+        self.state[point]["point"] = new_state
+        self.touch(point[0])
+
+    def get_chains(self, point):
+        """
+        Returns the chains of the point, empty if it is not part of one or
+        out of bounds.
+        """
+        state = self.state.get(point)
+        return state["chains"] if state else []
+
+    def start_chains(self, point):
+        """
+        Returns the chains of the point, which is hit, to add its chains to.
+        """
+        self.state[point]["is_in_chain"] = True
+        return self.state[point]["chains"]
+
+    def clear_chains(self, point):
+        """
+        Forgets the chains of the point.
+        """
+        self.state[point]["chains"] = []
+        self.state[point]["is_in_chain"] = False
+
+    def display_board(self):
+        """
+        Returns the current state of the board as an array of arrays of
+        relevant symbols representing hits, misses, ships and orientation help
+        for placing ships.
+
+        Used by display_screen to draw the user's and the computer's boards
+        side by side.
+        """
+        board_display = [list(['·'] * self.width)
+                         for i in range(self.height)]
+
+        for point in self.state:
+            # when rendering the computer's board, hide ships
+            if self.computer and self.state[point]["point"] == "ship":
+                continue
+            row, column = point
+            board_display[row][column] = states[self.state[point]["point"]]
+
+        return board_display
+
+    def render_row(self, row, hide_ships):
+        """
+        Returns the symbols of a row separated by spaces.
+        """
+        symbols = []
+        for column in range(self.width):
+            point = self.state[(row, column)]["point"]
+            if hide_ships and point == "ship":
+                point = "unmarked"
+            symbols.append(states[point])
+        return " ".join(symbols)
+
+    def occupied_mask(self):
+        """
+        Returns a bitmask of all the points that are not unmarked, with bit
+        row * width + column standing for the point.
+        """
+        mask = 0
+        for (row, column), state in self.state.items():
+            if state["point"] != "unmarked":
+                mask |= 1 << (row * self.width + column)
+        return mask
+
+    def show_directions(self, start_square, legit_dirs, ship):
+        """
+        Adds orientation help to the board when legitimate directions for ship
+        placement are identified.
+        """
+        start_square = (int(start_square[0]), int(start_square[1]))
+
+        self.state[start_square]["point"] = "ship"
+        self.touch(start_square[0])
+
+        for direction in legit_dirs:
+            for idx in range(1, self.fleet[ship]):
+                ship_point = step(start_square, direction, idx)
+                self.state[ship_point]["point"] = "orient"
+                self.touch(ship_point[0])
+
+    def implement_direction(self, start_square, direction, legit_dirs, ship):
+        """
+        Accept direction input if legitimate, throw error if not legitimate.
+
+        Returns True if the choice of starting coordinates should be reset,
+        otherwise None.
+        """
+        direction = self.check_direction(direction, legit_dirs)
+
+        start_square = (int(start_square[0]), int(start_square[1]))
+
+        # remove the orientation markings from the board
+        for point, state in self.state.items():
+            if state["point"] == "orient":
+                self.state[point] = {"point": "unmarked",
+                                     "chains": [],
+                                     "is_in_chain": False
+                                     }
+                self.touch(point[0])
+
+        if direction == "C":
+            # remove the starting square ship marking as well if reset
+            self.state[start_square]["point"] = "unmarked"
+            self.touch(start_square[0])
+            return True
+
+        points = [step(start_square, direction, idx)
+                  for idx in range(self.fleet[ship])]
+        for ship_point in points:
+            self.state[ship_point]["point"] = "ship"
+            self.touch(ship_point[0])
+        self.add_ship(ship, points)
+
+
+class BitBoard(BoardBase):
+    """
+    Initializes a board backed by bitmasks:
+
+    Each field state is an integer attribute named after it, with one bit
+    per point (bit row * width + column), 64 bits on a board of the
+    standard size, so a board is a handful of ints instead of a dictionary
+    per point. Offers the same methods as Board and can be used in its
+    place.
+    """
+
+    # the bit of every point, keyed by board size and then by coordinates,
+    # shared by every board of a size, so looking a point up takes a single
+    # dictionary lookup, same as on Board
+    point_bits = {}
+
+    def __init__(self, user=True, size=None, fleet=None):
+        super().__init__(user, size, fleet)
+        # bits of a whole row, shifted down to the first one
+        self.row_mask = (1 << self.width) - 1
+        if self.size not in BitBoard.point_bits:
+            BitBoard.point_bits[self.size] = {
+                (row, column): 1 << (row * self.width + column)
+                for row in range(self.height)
+                for column in range(self.width)
+            }
+        self.bits = BitBoard.point_bits[self.size]
+
+        self.ship = 0
+        self.orient = 0
+        self.hit = 0
+        self.miss = 0
+        # chains are only stored for points that are part of one, keyed by
+        # the number of their bit
+        self.chains = {}
+
+    def to_bit(self, coordinates):
+        """
+        Returns the bit representing the coordinates.
+
+        Raises a KeyError if the coordinates are out of bounds, same as
+        looking up a missing point in Board.state.
+        """
+        return self.bits[(coordinates[0], coordinates[1])]
+
+    def state_masks(self):
+        """
+        Returns the mask of every field state but unmarked, keyed by the
+        state.
+        """
+        return {"ship": self.ship, "orient": self.orient, "hit": self.hit,
+                "miss": self.miss}
+
+    @staticmethod
+    def ship_mask(start_square, direction, length, size=board_size):
+        """
+        Returns the mask covered by a ship of the given length placed from
+        the starting square in the given direction on a board of the given
+        size, or 0 if the ship would go out of bounds.
+        """
+        height, width = size
+        row, column = int(start_square[0]), int(start_square[1])
+        step_row, step_column = directions[direction]
+        end_row = row + step_row * (length - 1)
+        end_column = column + step_column * (length - 1)
+
+        if not (0 <= row < height and 0 <= column < width and
+                0 <= end_row < height and 0 <= end_column < width):
+            return 0
+
+        mask = 0
+        for idx in range(length):
+            mask |= 1 << ((row + idx * step_row) * width +
+                          column + idx * step_column)
+        return mask
+
+    def get_point(self, coordinates):
+        """
+        Returns the state of a single point.
+
+        Raises a KeyError if the coordinates are out of bounds.
+        """
+        bit = self.bits[(coordinates[0], coordinates[1])]
+        # a point is in at most one mask
+        if self.ship & bit:
+            return "ship"
+        if self.hit & bit:
+            return "hit"
+        if self.miss & bit:
+            return "miss"
+        if self.orient & bit:
+            return "orient"
+        return "unmarked"
+
+    def set_point(self, point, new_state):
+        """
+        Clears the bit of the point from all masks and sets it in the one
+        for the new state, so every point is in at most one mask.
+        """
+        bit = self.bits[(point[0], point[1])]
+        self.ship &= ~bit
+        self.orient &= ~bit
+        self.hit &= ~bit
+        self.miss &= ~bit
+        if new_state == "hit":
+            self.hit |= bit
+        elif new_state == "miss":
+            self.miss |= bit
+        elif new_state == "ship":
+            self.ship |= bit
+        elif new_state == "orient":
+            self.orient |= bit
+        self.touch(point[0])
+
+    def touch_mask(self, mask):
+        """
+        Marks the rows with any of the points in the mask as changed.
+        """
+        row = 0
+        while mask:
+            if mask & self.row_mask:
+                self.touch(row)
+            mask >>= self.width
+            row += 1
+
+    def get_chains(self, point):
+        """
+        Returns the chains of the point, empty if it is not part of one or
+        out of bounds.
+        """
+        row, column = point
+        if not (0 <= row < self.height and 0 <= column < self.width):
+            return []
+        return self.chains.get(row * self.width + column, [])
+
+    def start_chains(self, point):
+        """
+        Returns the chains of the point, which is hit, to add its chains to.
+        """
+        return self.chains.setdefault(point[0] * self.width + point[1], [])
+
+    def clear_chains(self, point):
+        """
+        Forgets the chains of the point.
+        """
+        self.chains.pop(point[0] * self.width + point[1], None)
+
+    def display_board(self):
+        """
+        Returns the current state of the board as an array of arrays of
+        relevant symbols, same as Board.display_board.
+        """
+        board_display = [list(['·'] * self.width)
+                         for i in range(self.height)]
+
+        for state, mask in self.state_masks().items():
+            # when rendering the computer's board, hide ships
+            if self.computer and state == "ship":
+                continue
+            while mask:
+                # isolate and clear the lowest set bit
+                bit = mask & -mask
+                mask ^= bit
+                row, column = divmod(bit.bit_length() - 1, self.width)
+                board_display[row][column] = states[state]
+
+        return board_display
+
+    def render_row(self, row, hide_ships):
+        """
+        Returns the symbols of a row separated by spaces.
+        """
+        symbols = [states["unmarked"]] * self.width
+        for state, mask in self.state_masks().items():
+            if hide_ships and state == "ship":
+                continue
+            row_mask = mask >> (row * self.width) & self.row_mask
+            for column in range(self.width):
+                if row_mask >> column & 1:
+                    symbols[column] = states[state]
+        return " ".join(symbols)
+
+    def occupied_mask(self):
+        """
+        Returns a bitmask of all the points that are not unmarked.
+        """
+        return self.ship | self.orient | self.hit | self.miss
+
+    def show_directions(self, start_square, legit_dirs, ship):
+        """
+        Adds orientation help to the board when legitimate directions for ship
+        placement are identified.
+        """
+        start_bit = self.to_bit(start_square)
+
+        start = (int(start_square[0]), int(start_square[1]))
+        for direction in legit_dirs:
+            self.orient |= self.placements[self.fleet[ship]][direction][start]
+
+        self.orient &= ~start_bit
+        self.ship |= start_bit
+        self.touch_mask(self.orient | start_bit)
+
+    def implement_direction(self, start_square, direction, legit_dirs, ship):
+        """
+        Accept direction input if legitimate, throw error if not legitimate.
+
+        Returns True if the choice of starting coordinates should be reset,
+        otherwise None.
+        """
+        direction = self.check_direction(direction, legit_dirs)
+
+        # remove the orientation markings from the board
+        self.touch_mask(self.orient)
+        self.orient = 0
+
+        if direction == "C":
+            # remove the starting square ship marking as well if reset
+            start_bit = self.to_bit(start_square)
+            self.ship &= ~start_bit
+            self.touch_mask(start_bit)
+            return True
+
+        start = (int(start_square[0]), int(start_square[1]))
+        ship_mask = self.placements[self.fleet[ship]][direction][start]
+        self.ship |= ship_mask
+        self.touch_mask(ship_mask)
+        self.add_ship(ship, [step(start, direction, idx)
+                             for idx in range(self.fleet[ship])])
+
+
+class SparseBoard(BoardBase):
+    """
+    Initializes a sparse board:
+
+    Only stores the points that are not unmarked, in a dictionary of their
+    states keyed by coordinate tuples, so setting up a board, placing ships
+    and targeting take as long as the ships and shots need, however large
+    the board. Meant for boards of thousands of points across. Offers the
+    same methods as Board, apart from occupied_mask, and has no placement
+    index.
+    """
+
+    indexed = False
+
+    def __init__(self, user=True, size=None, fleet=None):
+        super().__init__(user, size, fleet)
+
+        self.points = {}
+        # chains are only stored for points that are part of one
+        self.chains = {}
+
+    def get_point(self, coordinates):
+        """
+        Returns the state of a single point.
+
+        Raises a KeyError if the coordinates are out of bounds.
+        """
+        row, column = int(coordinates[0]), int(coordinates[1])
+        if not (0 <= row < self.height and 0 <= column < self.width):
+            raise KeyError((row, column))
+        return self.points.get((row, column), "unmarked")
+
+    def state_masks(self):
+        """
+        Returns the mask of every field state but unmarked, keyed by the
+        state, going through the marked points only.
+        """
+        masks = {"ship": 0, "orient": 0, "hit": 0, "miss": 0}
+        for (row, column), state in self.points.items():
+            masks[state] |= 1 << (row * self.width + column)
+        return masks
+
+    def set_point(self, point, new_state):
+        """
+        Stores the new state of the point, forgetting it if it is unmarked.
+        """
+        if new_state == "unmarked":
+            self.points.pop(point, None)
+        else:
+            self.points[point] = new_state
+        self.touch(point[0])
+
+    def get_chains(self, point):
+        """
+        Returns the chains of the point, empty if it is not part of one.
+        """
+        return self.chains.get(point, [])
+
+    def start_chains(self, point):
+        """
+        Returns the chains of the point, which is hit, to add its chains to.
+        """
+        return self.chains.setdefault(point, [])
+
+    def clear_chains(self, point):
+        """
+        Forgets the chains of the point.
+        """
+        self.chains.pop(point, None)
+
+    def display_board(self):
+        """
+        Returns the current state of the board as an array of arrays of
+        relevant symbols, same as Board.display_board.
+        """
+        board_display = [list(['·'] * self.width)
+                         for i in range(self.height)]
+
+        for (row, column), state in self.points.items():
+            # when rendering the computer's board, hide ships
+            if self.computer and state == "ship":
+                continue
+            board_display[row][column] = states[state]
+
+        return board_display
+
+    def render_row(self, row, hide_ships):
+        """
+        Returns the symbols of a row separated by spaces.
+        """
+        symbols = [states["unmarked"]] * self.width
+        for (point_row, column), state in self.points.items():
+            if point_row == row and not (hide_ships and state == "ship"):
+                symbols[column] = states[state]
+        return " ".join(symbols)
+
+    def find_legitimate_directions(self, starting_square, ship):
+        """
+        Returns legitimate orientations for placing the ships, that do not go
+        out of bounds or intersect an already placed ship.
+        """
+        start = (int(starting_square[0]), int(starting_square[1]))
+        legit_dirs = []
+
+        for direction in directions:
+            for idx in range(self.fleet[ship]):
+                try:
+                    if self.get_point(step(start, direction, idx)) != \
+                            "unmarked":
+                        break
+                except KeyError:
+                    break
+            else:
+                legit_dirs.append(direction)
+
+        if len(legit_dirs) == 0:
+            raise ValueError(
+                "Ship cannot be placed in any orientation from the chosen "
+                "starting position\nwithout overlapping another ship or going"
+                " out of bounds.")
+
+        return legit_dirs
+
+    def show_directions(self, start_square, legit_dirs, ship):
+        """
+        Adds orientation help to the board when legitimate directions for ship
+        placement are identified.
+        """
+        start_square = (int(start_square[0]), int(start_square[1]))
+
+        self.set_point(start_square, "ship")
+        for direction in legit_dirs:
+            for idx in range(1, self.fleet[ship]):
+                self.set_point(step(start_square, direction, idx), "orient")
+
+    def implement_direction(self, start_square, direction, legit_dirs, ship):
+        """
+        Accept direction input if legitimate, throw error if not legitimate.
+
+        Returns True if the choice of starting coordinates should be reset,
+        otherwise None.
+        """
+        direction = self.check_direction(direction, legit_dirs)
+
+        start_square = (int(start_square[0]), int(start_square[1]))
+
+        # remove the orientation markings from the board
+        for point in [point for point, state in self.points.items()
+                      if state == "orient"]:
+            self.set_point(point, "unmarked")
+
+        if direction == "C":
+            # remove the starting square ship marking as well if reset
+            self.set_point(start_square, "unmarked")
+            return True
+
+        points = [step(start_square, direction, idx)
+                  for idx in range(self.fleet[ship])]
+        for point in points:
+            self.set_point(point, "ship")
+        self.add_ship(ship, points)
+
+
+def build_placement_index(size=board_size, lengths=None):
+    """
+    Returns the bitmasks of every placement that stays in bounds of a board
+    of the given size, keyed by ship length, direction and starting square,
+    for the given lengths or the ones of the standard fleet.
+    """
+    height, width = size
+    lengths = lengths if lengths else set(ships.values())
+    index = {}
+    for length in lengths:
+        index[length] = {}
+        for direction in directions:
+            index[length][direction] = {}
+            for row in range(height):
+                for column in range(width):
+                    mask = BitBoard.ship_mask(
+                        (row, column), direction, length, size)
+                    if mask:
+                        index[length][direction][(row, column)] = mask
+    return index
+
+
+# placement indexes by board size and ship lengths, as they are the same for
+# every board of that size holding those ships
+placement_indexes = {}
+
+
+def get_placement_index(size, fleet):
+    """
+    Returns the placement index for boards of the given size holding the
+    given fleet, building it the first time it is needed.
+    """
+    key = (size, frozenset(fleet.values()))
+    if key not in placement_indexes:
+        placement_indexes[key] = build_placement_index(
+            size, set(fleet.values()))
+    return placement_indexes[key]
+
+
+# the placements of ships of each length on boards of each size, keyed by
+# size and length, as (mask, (starting square, direction)) pairs in the order
+# of the placement index
+placement_lists = {}
+
+
+def get_placement_list(board, length):
+    """
+    Returns the placements of a ship of the given length on the board as
+    (mask, (starting square, direction)) pairs, in the order of its
+    placement index, building the list the first time it is needed.
+    """
+    key = (board.size, length)
+    if key not in placement_lists:
+        placement_lists[key] = [
+            (mask, (start_square, direction))
+            for direction, starts in board.placements[length].items()
+            for start_square, mask in starts.items()
+        ]
+    return placement_lists[key]
+
+
+def placement_masks(size, length):
+    """
+    Returns the mask of every placement of a ship of the given length on
+    boards of the given size, each placement once, in the order of the
+    placement index.
+    """
+    index = get_placement_index(size, {"ship": length})
+    # the index lists every placement twice, e.g. from its top going south
+    # and from its bottom going north, so only one is taken
+    return [mask for direction in ["S", "E"]
+            for mask in index[length][direction].values()]
+
+
+placement_index = get_placement_index(board_size, ships)
+
+# boards with more points than this are backed by SparseBoard unless an
+# engine is chosen, as the other engines take time and memory per point
+dense_area_limit = 32 * 32
+
+
+# the engine backing both boards can be switched with the BATTLESHIP_ENGINE
+# environment variable
+board_engines = {
+    "dict": Board,
+    "bitboard": BitBoard,
+    "sparse": SparseBoard
+}
+
+board_engine = board_engines[os.environ.get("BATTLESHIP_ENGINE", "dict")]
+
+# how the computer chooses its targets
+targeting_modes = ["chains", "density", "montecarlo"]
+
+targeting_mode = os.environ.get("BATTLESHIP_AI", "chains")
+
+
+def parse_input(input):
+    """
+    Parses the input of a square for placing ships or targeting enemy ships.
+    If the input is not valid, returns a ValueError.
+    """
+    # ensures trailing spaces and spaces between characters are tolerated
+    processed_input = sub(r"\s+", "", input)
+
+    try:
+        if (len(processed_input) > 2):
+            raise ValueError(
+                "Input can contain only two characters (a letter A-H and\n"
+                "a number 1-8) and spaces.\n"
+                f"Input contains {len(processed_input)} characters.")
+
+        # looks for column names
+        # handles lower case and any order
+        column = findall(f"[{''.join(columns)}]", input.upper())
+
+        if len(column) < 1:
+            raise ValueError(
+                "Input string should contain exactly one reference\n"
+                "to a column (a letter from A to H or a to h).\n")
+
+        # looks for row number
+        # handles any order
+        row = findall(f"[{''.join(rows)}]", input)
+
+        if len(row) < 1:
+            raise ValueError(
+                f"Input string should contain exactly one reference\n"
+                "to a row (a number from 1 to 8).\n")
+
+        return [int(row[0]) - 1, columns.index(column[0])]
+
+    except Exception as e:
+        raise ValueError(f"Input not accepted: {e}")
+
+
+def place_ships_randomly(board):
+    """
+    Automatically generates the setup of the board.
+
+    Places each ship in one of its legal placements, chosen uniformly from
+    the placement index. Boards without one, which are too large for it,
+    draw placements at random until one is legal instead, which gives the
+    same odds and rarely takes more than one draw on a board that large.
+
+    Returns the layout as a list of (ship, starting square, direction)
+    tuples.
+    """
+    layout = []
+    # kept up to date as ships are placed instead of scanning the board
+    occupied = board.occupied_mask() if board.placements is not None else 0
+    for ship in board.fleet:
+        if board.placements is None:
+            while True:
+                start_square = (randint(0, board.height - 1),
+                                randint(0, board.width - 1))
+                direction = choice(list(directions))
+                try:
+                    if direction in board.find_legitimate_directions(
+                            start_square, ship):
+                        break
+                except ValueError:
+                    continue
+        else:
+            placements = get_placement_list(board, board.fleet[ship])
+            # with nothing placed yet, every placement is legal
+            if occupied:
+                mask, (start_square, direction) = choice(
+                    [placement for placement in placements
+                     if not placement[0] & occupied])
+            else:
+                mask, (start_square, direction) = choice(placements)
+            occupied |= mask
+        board.implement_direction(start_square, direction, [direction], ship)
+        layout.append((ship, start_square, direction))
+    return layout
+
+
+def computer_choose_target(board, mode=None, start=None):
+    """
+    Chooses a target for the computer using info on previous hits.
+
+    In density mode, fires at the point most likely to hide a ship according
+    to the heat map of the board. In montecarlo mode, fires at the point
+    most often covered by a ship in fleet layouts sampled within the time
+    budget of a move, or, if none of the budget is left, at the best point
+    of the heat map. Otherwise follows chains of hits and identifies and
+    corrects retargeting, and fires at a random point not targeted yet when
+    there are no chains to follow.
+
+    The density and montecarlo modes look their first shots up in the
+    opening book of the mode instead, if it was built, and solve the
+    endgame exactly once few enough layouts of the fleet are left. Boards
+    without a placement index, which are too large for those modes, are
+    targeted in chains mode instead.
+
+    Uses the mode set by the BATTLESHIP_AI environment variable unless
+    another mode is passed in.
+
+    The time budget of the move counts from the start given, as a
+    perf_counter time, e.g. when the move was queued to be chosen on
+    another thread, so the time it waited comes out of its budget.
+    """
+    if mode is None:
+        mode = targeting_mode
+    if board.placements is None:
+        mode = "chains"
+    # modes with a time budget keep to it for the whole move
+    if start is None:
+        start = perf_counter()
+
+    if mode in ("density", "montecarlo") and board.heat_map is None:
+        # imported here so the book is only mapped once it is needed
+        from openingbook import book_target
+
+        # the opening comes from the book, if one was built for the mode
+        target = book_target(board, mode)
+        if target is not None:
+            return target
+
+    if mode in ("density", "montecarlo"):
+        # imported here so the solver is only loaded once it is needed
+        import endgame
+
+        time_budget = max(0, start + endgame.density_budget - perf_counter())
+        if mode == "montecarlo":
+            # imported here so NumPy is only loaded once it is needed
+            import montecarlo
+
+            # the solver and the sampling share the time budget of the move,
+            # the solver taking at most half of what is left, so the
+            # sampling has time for its batches
+            deadline = start + montecarlo.budget
+            time_budget = min(
+                max(0, start + endgame.budget - perf_counter()),
+                max(0, deadline - perf_counter()) / 2)
+
+        # the endgame is solved exactly, once few enough layouts are left
+        target = endgame.choose_target(board, time_budget)
+        if target is not None:
+            return target
+
+    if mode == "montecarlo":
+        time_left = deadline - perf_counter()
+        if time_left > 0:
+            return montecarlo.choose_target(board, time_left)
+        # the move spent its budget waiting to be chosen, so the heat map,
+        # which takes microseconds, chooses instead of sampling
+        mode = "density"
+
+    if mode == "density":
+        # imported here so NumPy is only loaded once it is needed
+        from heatmap import HeatMap
+
+        if board.heat_map is None:
+            board.heat_map = HeatMap(board)
+        return board.heat_map.best_target()
+
+    # otherwise, pick the last hit you haven't ruled out and follow its
+    # direction, skipping the chain ends that lead to points targeted already
+    target = board.chain_ends.next_target(board)
+
+    # if there are no previous hits to go on, pick randomly, drawing again
+    # until the point was not targeted already
+    if target is None:
+        while True:
+            target = divmod(randrange(board.height * board.width),
+                            board.width)
+            if board.get_point(target) not in ("hit", "miss"):
+                return [target[0], target[1]]
+
+    return (target[0], target[1])
@@ -0,0 +1,141 @@
+"""
+Heat map used by the density targeting mode.
+
+Kept apart from the rest of the game logic, as it is the only part of it
+that needs NumPy.
+"""
+from random import choice
+
+import numpy as np
+
+from batch import get_placement_matrix
+from game import ships, board_size
+
+
+class HeatMap():
+    """
+    Initializes a heat map:
+
+    Counts for every point how many legal placements of the ships cover it.
+    Placements through a miss are ruled out and placements through a hit
+    weigh more, so the point with the highest count is the most likely one
+    to hide a ship. Once a ship is sunk, its placements and the ones through
+    its points are ruled out as well, along with the weight of its hits.
+
+    The counts are updated after every shot instead of being recomputed.
+
+    Covers a board of the standard size holding the standard fleet unless
+    the board it is set up for has another size or fleet. Raises a
+    ValueError for boards without a placement index, as the counts take
+    memory per placement.
+    """
+
+    # extra weight of a placement for every hit it covers
+    hit_weight = 20
+
+    # placements are the same for every heat map of a board size and fleet,
+    # so they are only built once: a 0/1 matrix with a row per placement and
+    # a column per point, for every point the rows of the placements
+    # covering it and for every ship the range of its rows, keyed by board
+    # size and ship lengths
+    placements = {}
+
+    @classmethod
+    def build_placements(cls, size=board_size, fleet=None):
+        """
+        Builds the matrix of all placements of all the ships that do not go
+        out of bounds.
+        """
+        fleet = fleet if fleet else ships
+        area = size[0] * size[1]
+
+        matrices = [get_placement_matrix(size, length)
+                    for length in fleet.values()]
+        cover = np.concatenate(matrices).astype(np.int64)
+        covering = [np.flatnonzero(cover[:, point]) for point in range(area)]
+        ends = np.cumsum([len(matrix) for matrix in matrices])
+        ranges = [np.arange(end - len(matrix), end)
+                  for matrix, end in zip(matrices, ends)]
+        cls.placements[(size, tuple(fleet.values()))] = \
+            (cover, covering, ranges)
+
+    def __init__(self, board=None):
+        size = board.size if board is not None else board_size
+        fleet = board.fleet if board is not None else ships
+        if board is not None and board.placements is None:
+            raise ValueError(
+                "Density targeting needs a board with a placement index.")
+
+        key = (size, tuple(fleet.values()))
+        if key not in HeatMap.placements:
+            HeatMap.build_placements(size, fleet)
+        self.cover, self.covering, ranges = HeatMap.placements[key]
+        self.ship_rows = dict(zip(fleet, ranges))
+        self.width = size[1]
+
+        self.alive = np.ones(len(self.cover), dtype=bool)
+        self.weights = np.ones(len(self.cover), dtype=np.int64)
+        self.counts = self.cover.sum(axis=0)
+        self.targeted = np.zeros(size[0] * size[1], dtype=bool)
+
+        # catch up with any shots taken before the heat map was set up
+        if board is not None:
+            masks = board.point_masks()
+            targeted = masks["hit"] | masks["miss"]
+            for point in range(size[0] * size[1]):
+                if targeted >> point & 1:
+                    self.record(divmod(point, self.width),
+                                bool(masks["hit"] >> point & 1))
+            for ship in board.sunk:
+                self.sink(ship, board.ship_points[ship])
+
+    def record(self, coordinates, hit):
+        """
+        Updates the counts after a shot at the coordinates.
+        """
+        point = int(coordinates[0]) * self.width + int(coordinates[1])
+        self.targeted[point] = True
+
+        # only placements that are still legal can change the counts
+        affected = self.covering[point]
+        affected = affected[self.alive[affected]]
+
+        if hit:
+            self.weights[affected] += self.hit_weight
+            self.counts += self.hit_weight * \
+                self.cover[affected].sum(axis=0)
+        else:
+            self.rule_out(affected)
+
+    def sink(self, ship, points):
+        """
+        Updates the counts after the ship sank at the points.
+        """
+        rows = [self.ship_rows[ship]]
+        for row, column in points:
+            rows.append(self.covering[int(row) * self.width + int(column)])
+        affected = np.unique(np.concatenate(rows))
+        self.rule_out(affected[self.alive[affected]])
+
+    def rule_out(self, affected):
+        """
+        Takes the legal placements in the given rows out of the counts.
+        """
+        self.alive[affected] = False
+        self.counts -= self.weights[affected] @ self.cover[affected]
+
+    def best_targets(self):
+        """
+        Returns the points, as numbers row * width + column, of the
+        untargeted points with the highest count, in ascending order.
+        """
+        counts = np.where(self.targeted, -1, self.counts)
+        return np.flatnonzero(counts == counts.max())
+
+    def best_target(self):
+        """
+        Returns the coordinates of an untargeted point with the highest
+        count, choosing randomly between ties.
+        """
+        point = int(choice(self.best_targets()))
+        return divmod(point, self.width)
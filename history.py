@@ -0,0 +1,367 @@
+"""
+Game history.
+
+When the BATTLESHIP_HISTORY environment variable names a SQLite database,
+every finished game is stored in it: the layout of both fleets, every shot
+with its outcome, who won, the number of shots the winner took, how long
+the game took and the targeting mode the computer played.
+
+Sessions never write to the database themselves. A finished game is put
+on a queue, which a thread of the process writes to the database in
+batches of up to as many games as the BATTLESHIP_HISTORY_BATCH environment
+variable says, or of the games finished within a second, one transaction
+per batch. The database is kept in WAL mode, so the queries below can run
+while games are written, and several processes can share it.
+
+The queue holds up to as many games as the BATTLESHIP_HISTORY_QUEUE
+environment variable says. Games finished while it is full, or once the
+database turned out not to open, are dropped rather than held up, as are
+batches failing for any reason but the database being locked by another
+process, which they wait for. The writer keeps the error and the number of
+games dropped, and reports them once the process exits, so nothing is
+printed over the game being played.
+
+A layout is stored as JSON, a list of [ship, [row, column], direction]
+lists, and the shots as a byte per shot, holding the point (row * 8 +
+column) in bits 0 to 5, whether it hit in bit 6 and the player in bit 7
+(set for the computer).
+
+`python3 history.py leaderboard` lists the user's fastest wins, and
+`python3 history.py stats` the results of every targeting mode.
+"""
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+from time import monotonic, perf_counter, sleep, time
+
+database_path = os.environ.get("BATTLESHIP_HISTORY")
+
+batch_size = int(os.environ.get("BATTLESHIP_HISTORY_BATCH", 100))
+
+queue_size = int(os.environ.get("BATTLESHIP_HISTORY_QUEUE", 10000))
+
+# seconds a batch waits for more games before it is written
+flush_interval = 1
+
+players = ["user", "computer"]
+
+schema = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    finished REAL NOT NULL,
+    mode TEXT NOT NULL,
+    winner TEXT NOT NULL,
+    shots INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    user_layout TEXT NOT NULL,
+    computer_layout TEXT NOT NULL,
+    moves BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_winner
+    ON games (winner, shots, duration);
+CREATE INDEX IF NOT EXISTS games_by_mode
+    ON games (mode, winner, shots);
+"""
+
+insert = """
+INSERT INTO games (finished, mode, winner, shots, duration, user_layout,
+                   computer_layout, moves)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# the writer of the process, started once the first game is finished
+writer = None
+writer_lock = threading.Lock()
+
+
+def connect(path):
+    """
+    Returns a connection to the database, creating the table and its
+    indexes if they are missing.
+    """
+    # imported here so sessions not storing games do not load it
+    import sqlite3
+
+    # waits for other processes writing to the database instead of failing
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # in WAL mode, commits are safe from corruption without waiting for
+    # every one of them to reach the disk
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(schema)
+    return connection
+
+
+class Writer(threading.Thread):
+    """
+    Initializes a writer:
+
+    A thread writing the games put on its queue to the database in
+    batches, until it is stopped, along with the games it dropped and the
+    last error it ran into.
+    """
+
+    def __init__(self, path, size=None):
+        super().__init__(name="history-writer", daemon=True)
+        self.path = path
+        self.queue = queue.Queue(size if size else queue_size)
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.error = None
+        # set once the database could not be opened
+        self.failed = False
+
+    def put(self, row):
+        """
+        Queues the row to be written without waiting, or drops it if the
+        queue is full or the database could not be opened.
+        """
+        if not self.failed:
+            try:
+                self.queue.put_nowait(row)
+                return
+            except queue.Full:
+                pass
+        self.dropped += 1
+
+    def run(self):
+        import sqlite3
+
+        try:
+            connection = connect(self.path)
+        except sqlite3.Error as e:
+            self.error = str(e)
+            self.failed = True
+            # the games queued until now are dropped along with the ones
+            # finished later
+            while True:
+                try:
+                    self.dropped += self.queue.get_nowait() is not None
+                except queue.Empty:
+                    return
+        stopped = False
+        while not stopped:
+            rows = [self.queue.get()]
+            deadline = monotonic() + flush_interval
+            while rows[-1] is not None and len(rows) < batch_size:
+                try:
+                    rows.append(self.queue.get(
+                        timeout=max(0, deadline - monotonic())))
+                except queue.Empty:
+                    break
+            # None on the queue stops the writer once the games before it
+            # are written
+            if rows[-1] is None:
+                stopped = True
+                rows.pop()
+            if rows:
+                self.write(connection, rows)
+        connection.close()
+
+    def write(self, connection, rows):
+        """
+        Inserts the rows in a single transaction, trying again as long as
+        the database is locked, or drops them if the transaction fails
+        otherwise.
+        """
+        import sqlite3
+
+        while True:
+            try:
+                with connection:
+                    connection.executemany(insert, rows)
+                break
+            except sqlite3.Error as e:
+                # other processes holding the database raise "database is
+                # locked" or "database table is locked"
+                if "locked" in str(e):
+                    sleep(flush_interval)
+                    continue
+                self.error = str(e)
+                self.dropped += len(rows)
+                return
+        self.written += len(rows)
+        self.batches += 1
+
+    def stop(self, timeout=None):
+        """
+        Writes the games left on the queue and waits for the thread to end.
+        """
+        if not self.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.join(timeout)
+
+
+def get_writer():
+    """
+    Returns the writer of the process, starting it the first time it is
+    needed.
+    """
+    global writer
+    with writer_lock:
+        if writer is None:
+            writer = Writer(database_path)
+            writer.start()
+            atexit.register(close)
+        return writer
+
+
+def close():
+    """
+    Writes the games still queued and stops the writer, for processes
+    about to exit.
+    """
+    global writer
+    with writer_lock:
+        if writer is not None:
+            writer.stop(timeout=10)
+            if writer.dropped:
+                print(f"{writer.dropped} finished games were not stored in "
+                      f"{writer.path}: {writer.error or 'the queue was full'}"
+                      ".", file=sys.stderr)
+            writer = None
+
+
+class History():
+    """
+    Initializes the history of a session:
+
+    Records the game being played and queues it to be written once it is
+    finished.
+    """
+
+    def __init__(self):
+        self.game = None
+
+    def start_game(self, mode):
+        """
+        Starts recording a new game, with the computer playing the given
+        targeting mode.
+        """
+        self.game = {
+            "mode": mode,
+            "start": perf_counter(),
+            "layouts": {"user": [], "computer": []},
+            "shots": {"user": 0, "computer": 0},
+            "moves": bytearray()
+        }
+
+    def place(self, player, ship, start_square, direction):
+        """
+        Records the placement of a ship by the player, with the direction
+        given as one of game.directions.
+        """
+        self.game["layouts"][player].append(
+            [ship, [int(start_square[0]), int(start_square[1])], direction])
+
+    def shoot(self, player, target, hit):
+        """
+        Records a shot by the player and whether it hit.
+        """
+        self.game["shots"][player] += 1
+        self.game["moves"].append(
+            int(target[0]) * 8 + int(target[1]) | int(hit) << 6 |
+            players.index(player) << 7)
+
+    def finish(self, winner):
+        """
+        Queues the game, won by the given player, to be written, without
+        waiting for it to be written.
+        """
+        game = self.game
+        self.game = None
+        get_writer().put((
+            time(), game["mode"], winner, game["shots"][winner],
+            perf_counter() - game["start"],
+            json.dumps(game["layouts"]["user"]),
+            json.dumps(game["layouts"]["computer"]),
+            bytes(game["moves"])))
+
+
+def read_games(connection):
+    """
+    Yields the games in the database in the order they were finished, in
+    the same form as movelog.read_games, so they can be replayed.
+    """
+    for user_layout, computer_layout, moves in connection.execute(
+            "SELECT user_layout, computer_layout, moves FROM games "
+            "ORDER BY id"):
+        yield {
+            "layouts": {
+                player: [(ship, tuple(start_square), direction)
+                         for ship, start_square, direction in json.loads(
+                             layout)]
+                for player, layout in zip(players,
+                                          [user_layout, computer_layout])
+            },
+            "shots": [(players[move >> 7], divmod(move & 63, 8),
+                       bool(move >> 6 & 1)) for move in moves]
+        }
+
+
+def leaderboard(connection, limit=10):
+    """
+    Returns the user's wins in the fewest shots, and the quickest of those
+    first, as (shots, seconds, mode, finished) tuples.
+    """
+    return connection.execute(
+        "SELECT shots, duration, mode, finished FROM games "
+        "WHERE winner = 'user' ORDER BY shots, duration LIMIT ?",
+        (limit,)).fetchall()
+
+
+def mode_stats(connection):
+    """
+    Returns, for every targeting mode the computer played, the games played,
+    the games it won and the average number of shots it took to win them,
+    as (mode, games, wins, shots) tuples.
+    """
+    return connection.execute(
+        "SELECT mode, COUNT(*), SUM(winner = 'computer'), "
+        "AVG(CASE WHEN winner = 'computer' THEN shots END) "
+        "FROM games GROUP BY mode ORDER BY mode").fetchall()
+
+
+def main():
+    """
+    Shows the leaderboard or the statistics of the targeting modes from the
+    command line.
+    """
+    import argparse
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("command", choices=["leaderboard", "stats"])
+    parser.add_argument("-d", "--database", default=database_path,
+                        help="database file, BATTLESHIP_HISTORY by default")
+    parser.add_argument("-n", "--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if not args.database:
+        sys.exit("No database given, set BATTLESHIP_HISTORY or pass -d.")
+    connection = connect(args.database)
+
+    if args.command == "leaderboard":
+        for rank, (shots, duration, mode, finished) in enumerate(
+                leaderboard(connection, args.limit), 1):
+            date = datetime.fromtimestamp(finished).strftime("%Y-%m-%d")
+            print(f"{rank:3}. {shots} shots in {duration:.0f} s against "
+                  f"{mode} on {date}")
+        return
+
+    for mode, games, wins, shots in mode_stats(connection):
+        shots = f"{shots:.1f}" if shots is not None else "-"
+        print(f"{mode:12} {games} games, won {wins} "
+              f"({wins / games:.0%}), {shots} shots per win")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Per-session metrics.
+
+When the BATTLESHIP_METRICS environment variable names a directory, every
+session counts the retries and errors it runs into and times how long it
+spends rendering frames and how long it waits for the user, and writes
+them to a file of its own there in the Prometheus text format, e.g. for
+the textfile collector of the node exporter. The file is replaced after
+every game and once the session ends.
+
+Sessions without metrics hold None instead, so all it costs them is
+checking for it.
+"""
+import os
+from bisect import bisect_left
+from itertools import count
+
+metrics_dir = os.environ.get("BATTLESHIP_METRICS")
+
+# numbers the sessions of a process
+session_numbers = count()
+
+# name: (type, help text, upper bounds of the buckets of a histogram)
+definitions = {
+    "battleship_games_total": (
+        "counter", "Games finished.", None),
+    "battleship_placement_retries_total": (
+        "counter", "Ship placements the user had to enter again.", None),
+    "battleship_retargets_total": (
+        "counter", "Targets the computer chose again in chains mode, as it "
+        "had targeted them already.", None),
+    "battleship_turn_errors_total": (
+        "counter", "Errors raised and handled while taking a turn.", None),
+    "battleship_render_seconds": (
+        "histogram", "Time spent building and writing a frame.",
+        [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05]),
+    "battleship_input_wait_seconds": (
+        "histogram", "Time spent waiting for the user to enter a line.",
+        [0.5, 1, 2, 5, 10, 30, 60, 300]),
+}
+
+
+class Metrics():
+    """
+    Initializes the metrics of a session:
+
+    Counters and histograms keyed by their name and labels, all of them
+    labelled with the session.
+    """
+
+    def __init__(self, path, session):
+        self.path = path
+        self.session = session
+        self.counters = {}
+        self.histograms = {}
+
+    @classmethod
+    def for_session(cls):
+        """
+        Returns the metrics of a new session, to be written to a file of
+        its own in the BATTLESHIP_METRICS directory, or None if the
+        variable is not set.
+        """
+        if not metrics_dir:
+            return None
+        session = f"{os.getpid()}-{next(session_numbers)}"
+        return cls(os.path.join(metrics_dir, f"battleship-{session}.prom"),
+                   session)
+
+    def count(self, name, amount=1, **labels):
+        """
+        Adds the amount to the counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        """
+        Adds the time to the histogram.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.histograms:
+            buckets = definitions[name][2]
+            self.histograms[key] = {"buckets": [0] * (len(buckets) + 1),
+                                    "sum": 0, "count": 0}
+        histogram = self.histograms[key]
+        # the last bucket holds the times above the highest bound
+        histogram["buckets"][bisect_left(definitions[name][2], seconds)] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+    def label_text(self, labels, extra=()):
+        """
+        Returns the labels, with the session first, in braces.
+        """
+        pairs = [("session", self.session), *labels, *extra]
+        return "{" + ",".join(f'{name}="{value}"'
+                              for name, value in pairs) + "}"
+
+    def export(self):
+        """
+        Returns the metrics in the Prometheus text format.
+        """
+        lines = []
+        for name, (kind, help_text, bounds) in definitions.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            if kind == "counter":
+                for (key_name, labels), value in self.counters.items():
+                    if key_name == name:
+                        lines.append(
+                            f"{name}{self.label_text(labels)} {value}")
+                continue
+
+            for (key_name, labels), histogram in self.histograms.items():
+                if key_name != name:
+                    continue
+                # buckets are cumulative
+                total = 0
+                for bound, bucket in zip([*bounds, "+Inf"],
+                                         histogram["buckets"]):
+                    total += bucket
+                    label_text = self.label_text(labels, [("le", bound)])
+                    lines.append(f"{name}_bucket{label_text} {total}")
+                label_text = self.label_text(labels)
+                lines.append(f"{name}_sum{label_text} {histogram['sum']}")
+                lines.append(
+                    f"{name}_count{label_text} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """
+        Replaces the metrics file, writing to a temporary file first so a
+        collector never reads half a file.
+        """
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as file:
+            file.write(self.export())
+        os.replace(temporary, self.path)
@@ -0,0 +1,127 @@
+"""
+Monte Carlo targeting mode.
+
+Samples fleet layouts consistent with the hits and misses on the board in
+vectorised batches, in the same way batch.py places fleets, and fires at
+the untargeted point most often covered by a ship across the samples.
+Only the ships not sunk yet are placed, and they keep off the points of
+the sunk ones.
+
+Sampling stops once the time budget of the move is about to run out, set
+in seconds by the BATTLESHIP_AI_BUDGET environment variable, so the
+computer never takes much longer than that to choose. As the number of
+batches that fit in the budget depends on the machine, games in this mode
+are not reproducible from a seed alone.
+"""
+import os
+from random import choice, getrandbits
+from time import perf_counter
+
+import numpy as np
+
+from batch import place_fleets
+
+budget = float(os.environ.get("BATTLESHIP_AI_BUDGET", 0.05))
+
+# layouts sampled at once
+batch_size = 256
+
+
+def sample_layouts(rng, board, misses):
+    """
+    Places a batch of the fleets afloat on the board, each ship in a
+    placement chosen uniformly from the ones that neither overlap the ships
+    placed so far nor go through a miss.
+
+    Returns an array with a row per layout that marks the points covered by
+    a ship, leaving out the layouts in which a ship could not be placed.
+    """
+    occupied = np.repeat(misses[np.newaxis].astype(np.float32), batch_size,
+                         axis=0)
+    placed = place_fleets(rng, occupied, board.fleet_afloat().values(),
+                          board.size)
+    return (occupied - misses > 0)[placed]
+
+
+def shot_arrays(board):
+    """
+    Returns boolean arrays marking the hits and the misses on the board,
+    with a point per element, counting the points of the sunk ships as
+    misses the same way endgame.board_shots does.
+    """
+    masks = board.point_masks()
+    area = board.height * board.width
+    return (mask_array(masks["hit"] & ~masks["sunk"], area),
+            mask_array(masks["miss"] | masks["sunk"], area))
+
+
+def mask_array(mask, area):
+    """
+    Returns a boolean array with an element per point of the given area,
+    set where the bit of the point is set in the mask.
+    """
+    data = np.frombuffer(mask.to_bytes(-(-area // 8), "little"),
+                         dtype=np.uint8)
+    return np.unpackbits(data, count=area, bitorder="little").astype(bool)
+
+
+def cover_counts(board, hits, misses, rng, deadline=None, batches=None):
+    """
+    Returns how often every point is covered by a ship across the layouts
+    sampled until the deadline, or in the given number of batches, with -1
+    for the points targeted already.
+
+    Only layouts covering every hit count. Until any of those turn up,
+    the layouts covering the most hits count instead.
+    """
+    counts = np.zeros(len(hits), dtype=np.int64)
+    best_coverage = -1
+    batch_time = 0
+    sampled = 0
+    # at least one batch is sampled, however short the budget
+    while True:
+        start = perf_counter()
+        layouts = sample_layouts(rng, board, misses)
+        coverage = layouts[:, hits].sum(axis=1)
+        if len(coverage) and coverage.max() >= best_coverage:
+            if coverage.max() > best_coverage:
+                best_coverage = coverage.max()
+                counts[:] = 0
+            counts += layouts[coverage == best_coverage].sum(axis=0)
+        end = perf_counter()
+        sampled += 1
+
+        if batches is not None:
+            if sampled >= batches:
+                break
+        else:
+            # stops before a batch would run past the deadline
+            batch_time = max(batch_time, end - start)
+            if end + batch_time > deadline:
+                break
+
+    counts[hits | misses] = -1
+    return counts
+
+
+def choose_target(board, time_budget=None):
+    """
+    Returns the untargeted point most often covered by a ship across the
+    layouts sampled within the time budget, choosing randomly between ties.
+
+    Raises a ValueError for boards without a placement index, which are too
+    large to sample.
+    """
+    if board.placements is None:
+        raise ValueError(
+            "Monte Carlo targeting needs a board with a placement index.")
+
+    deadline = perf_counter() + (budget if time_budget is None
+                                 else time_budget)
+    hits, misses = shot_arrays(board)
+    # seeded from random, so games can be seeded same as the other modes
+    rng = np.random.default_rng(getrandbits(64))
+
+    counts = cover_counts(board, hits, misses, rng, deadline=deadline)
+    point = int(choice(np.flatnonzero(counts == counts.max())))
+    return divmod(point, board.width)
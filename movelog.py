@@ -0,0 +1,219 @@
+"""
+Append-only move logs.
+
+When the BATTLESHIP_MOVE_LOG environment variable names a directory, every
+session appends the games it plays to a log file of its own there: the
+placement of every ship, then every shot with its outcome. Every event is
+written as soon as it happens, two bytes at a time, so a log is complete
+up to the last move even if the session is cut off.
+
+Every event is a byte holding its kind in bits 0 and 1, the player in bit 2
+(set for the computer), whether a shot hit in bit 3 and the index of a
+placed ship in bits 4 to 6, followed by a byte holding the point (row * 8 +
+column) with the direction of a placed ship in the top two bits. A game
+starts with an event holding the format version instead of a point.
+
+`python3 movelog.py logs/*.log` replays the logs through the headless
+engine without displaying anything and reports any shot whose outcome
+differs from the recorded one.
+"""
+import os
+import sys
+from itertools import count
+from time import perf_counter, strftime
+
+from game import ships, directions
+
+version = 1
+
+log_dir = os.environ.get("BATTLESHIP_MOVE_LOG")
+
+# kinds of events
+game_start = 0
+placement = 1
+shot = 2
+
+players = ["user", "computer"]
+ship_names = list(ships)
+direction_names = list(directions)
+
+# numbers the logs of the sessions of a process
+log_numbers = count()
+
+
+class MoveLog():
+    """
+    Initializes a move log:
+
+    Appends the events of the games played in a session to a file, which is
+    only created once the first game starts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    @classmethod
+    def for_session(cls):
+        """
+        Returns a log with a file of its own in the BATTLESHIP_MOVE_LOG
+        directory, or None if the variable is not set.
+        """
+        if not log_dir:
+            return None
+        name = f"{strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-" \
+            f"{next(log_numbers)}.log"
+        return cls(os.path.join(log_dir, name))
+
+    def write(self, first, second):
+        """
+        Appends an event.
+        """
+        if self.file is None:
+            # unbuffered, so every event reaches the file straight away
+            self.file = open(self.path, "ab", buffering=0)
+        self.file.write(bytes([first, second]))
+
+    def start_game(self):
+        """
+        Marks the start of a new game.
+        """
+        self.write(game_start, version)
+
+    def place(self, player, ship, start_square, direction):
+        """
+        Records the placement of a ship by the player, with the direction
+        given as one of game.directions.
+        """
+        self.write(
+            placement | players.index(player) << 2 |
+            ship_names.index(ship) << 4,
+            int(start_square[0]) * 8 + int(start_square[1]) |
+            direction_names.index(direction) << 6)
+
+    def shoot(self, player, target, hit):
+        """
+        Records a shot by the player and whether it hit.
+        """
+        self.write(shot | players.index(player) << 2 | int(hit) << 3,
+                   int(target[0]) * 8 + int(target[1]))
+
+    def close(self):
+        """
+        Closes the file, if it was created.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_games(path):
+    """
+    Reads a log and yields its games one by one.
+
+    Every game is a dictionary holding the layout of each player's fleet,
+    as (ship, starting square, direction) tuples, and the shots, as
+    (player, target, hit) tuples, in the order they were made.
+
+    Raises a ValueError if the log is not in this version of the format.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+
+    game = None
+    # an odd byte at the end is an event cut off while it was written
+    for idx in range(0, len(data) - 1, 2):
+        first, second = data[idx], data[idx + 1]
+        kind = first & 3
+        player = players[first >> 2 & 1]
+
+        if kind == game_start:
+            if second != version:
+                raise ValueError(
+                    f"Move log version {second} is not supported.")
+            if game is not None:
+                yield game
+            game = {"layouts": {"user": [], "computer": []}, "shots": []}
+        elif game is None:
+            raise ValueError(f"{path} does not start with a game.")
+        elif kind == placement:
+            game["layouts"][player].append((
+                ship_names[first >> 4 & 7],
+                divmod(second & 63, 8),
+                direction_names[second >> 6]))
+        elif kind == shot:
+            game["shots"].append(
+                (player, divmod(second & 63, 8), bool(first >> 3 & 1)))
+        else:
+            raise ValueError(f"Unknown event in {path}.")
+
+    if game is not None:
+        yield game
+
+
+def replay(game, engine=None):
+    """
+    Plays the recorded game through the headless engine.
+
+    Returns a list of (shot number, player, target, recorded hit) tuples
+    for every shot whose outcome differs from the one recorded.
+
+    Raises a ValueError if the game cannot be played as recorded, e.g. a
+    ship overlaps another or a player fires out of turn.
+    """
+    # imported here so logging games does not import the engine
+    from engine import Game
+
+    replayed = Game(engine=engine)
+    for player in players:
+        replayed.place_fleet(player, game["layouts"][player])
+
+    mismatches = []
+    for number, (player, target, hit) in enumerate(game["shots"]):
+        if replayed.user_turn != (player == "user"):
+            raise ValueError(f"Shot {number} is fired out of turn.")
+        if (replayed.fire(target) == "ship") != hit:
+            mismatches.append((number, player, target, hit))
+
+    return mismatches
+
+
+def main():
+    """
+    Replays the logs passed in and reports the games that did not play out
+    as recorded.
+    """
+    # imported here so sessions logging their games do not have to
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("logs", nargs="+")
+    args = parser.parse_args()
+
+    games = shots = failed = 0
+    start = perf_counter()
+    for path in args.logs:
+        for number, game in enumerate(read_games(path)):
+            games += 1
+            shots += len(game["shots"])
+            try:
+                mismatches = replay(game)
+            except ValueError as e:
+                failed += 1
+                print(f"{path} game {number}: {e}")
+                continue
+            if mismatches:
+                failed += 1
+                shot_number, player, target, hit = mismatches[0]
+                print(f"{path} game {number}: {len(mismatches)} shots "
+                      f"differ, first is shot {shot_number} by {player} at "
+                      f"{target}, recorded as a {'hit' if hit else 'miss'}")
+    elapsed = perf_counter() - start
+
+    print(f"{games} games, {shots} shots replayed, {failed} differ "
+          f"({games / elapsed:.0f} games per second)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Opening books of precomputed targets.
+
+The first shots the density and montecarlo modes fire on a board of the
+standard size holding the standard fleet only depend on the hits and
+misses so far, of which there are few in the opening. An offline build
+step follows every opening the mode can play for the first few shots and
+stores the best targets of every position on the way in a book, which the
+game memory-maps, so early turns are a lookup instead of a computation and
+every process on the host shares the same pages.
+
+Build a book with `python3 openingbook.py build density` (or montecarlo).
+Books are written to the books directory next to this file, or to the
+directory named by the BATTLESHIP_BOOK_DIR environment variable, and are
+only used if they are there.
+
+A book starts with a header:
+
+    4 bytes   b"BOOK"
+    1 byte    format version
+    1 byte    number of shots the book covers
+    2 bytes   unused
+    4 bytes   number of positions
+
+followed by a record of three 8-byte masks per position, sorted by the
+first two: the hits, the misses and the best targets, with bit
+row * 8 + column standing for the point. Numbers are little-endian.
+"""
+import mmap
+import os
+import struct
+from random import choice
+
+from game import ships, board_size
+
+magic = b"BOOK"
+version = 1
+
+header = struct.Struct("<4sBBHI")
+record = struct.Struct("<QQQ")
+
+book_dir = os.environ.get(
+    "BATTLESHIP_BOOK_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "books"))
+
+# books by mode, None for modes without a book
+books = {}
+
+
+class Book():
+    """
+    Initializes a book:
+
+    Maps the book file into memory and looks positions up by binary search
+    on the mapped records, without reading the book into the process.
+
+    Raises a ValueError if the file is not a book in this version of the
+    format.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < header.size:
+            raise ValueError(f"{path} is not an opening book.")
+        book_magic, book_version, self.depth, _, self.size = \
+            header.unpack_from(self.data)
+        if book_magic != magic:
+            raise ValueError(f"{path} is not an opening book.")
+        if book_version != version:
+            raise ValueError(
+                f"Opening book version {book_version} is not supported.")
+        if len(self.data) != header.size + self.size * record.size:
+            raise ValueError(f"{path} is cut short.")
+
+    def lookup(self, hits, misses):
+        """
+        Returns the mask of the best targets of the position, or None if
+        the position is not in the book.
+        """
+        key = (hits, misses)
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            position_hits, position_misses, best = record.unpack_from(
+                self.data, header.size + middle * record.size)
+            if (position_hits, position_misses) < key:
+                low = middle + 1
+            elif (position_hits, position_misses) > key:
+                high = middle
+            else:
+                return best
+        return None
+
+
+def get_book(mode):
+    """
+    Returns the book of the targeting mode, mapping it the first time it is
+    needed, or None if it was not built.
+    """
+    if mode not in books:
+        path = os.path.join(book_dir, f"{mode}.book")
+        books[mode] = Book(path) if os.path.exists(path) else None
+    return books[mode]
+
+
+def book_target(board, mode):
+    """
+    Returns the target the book of the mode holds for the board, choosing
+    randomly between ties, or None if the book does not cover the position.
+    """
+    # the book is built without any ship sinking, which the modes take
+    # into account
+    if board.size != board_size or board.fleet != ships or board.sunk:
+        return None
+    book = get_book(mode)
+    if book is None:
+        return None
+
+    # imported here so the game only loads it along with a book
+    from snapshot import board_masks
+
+    _, _, hits, misses = board_masks(board)
+    best = book.lookup(hits, misses)
+    if not best:
+        return None
+
+    # the same choice in the same order as HeatMap.best_target
+    points = [point for point in range(64) if best >> point & 1]
+    return divmod(choice(points), 8)
+
+
+def best_targets(mode, hits, misses, samples):
+    """
+    Returns the mask of the best targets of the mode in the position.
+    """
+    import numpy as np
+
+    from game import BitBoard
+
+    board = BitBoard()
+    if mode == "density":
+        from heatmap import HeatMap
+
+        heat_map = HeatMap()
+        for point in range(64):
+            if (hits | misses) >> point & 1:
+                heat_map.record(divmod(point, 8), hits >> point & 1)
+        points = heat_map.best_targets()
+    else:
+        from montecarlo import batch_size, cover_counts
+
+        hit_array = np.array([hits >> point & 1 for point in range(64)],
+                             dtype=bool)
+        miss_array = np.array([misses >> point & 1 for point in range(64)],
+                              dtype=bool)
+        rng = np.random.default_rng(hits * 31 + misses)
+        counts = cover_counts(board, hit_array, miss_array, rng,
+                              batches=max(1, samples // batch_size))
+        points = np.flatnonzero(counts == counts.max())
+
+    best = 0
+    for point in points:
+        best |= 1 << int(point)
+    return best
+
+
+def build(mode, depth, samples):
+    """
+    Follows every opening the mode can play for the given number of shots,
+    every best target hitting and missing, and returns the best targets of
+    every position on the way, keyed by its hits and misses.
+    """
+    positions = {}
+    level = {(0, 0)}
+    for _ in range(depth):
+        next_level = set()
+        for hits, misses in level:
+            best = best_targets(mode, hits, misses, samples)
+            positions[(hits, misses)] = best
+            for point in range(64):
+                if best >> point & 1:
+                    next_level.add((hits | 1 << point, misses))
+                    next_level.add((hits, misses | 1 << point))
+        level = next_level
+    return positions
+
+
+def write(path, depth, positions):
+    """
+    Writes the positions to a book, replacing it at once so running games
+    never map half a book.
+    """
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(header.pack(magic, version, depth, 0, len(positions)))
+        for (hits, misses), best in sorted(positions.items()):
+            file.write(record.pack(hits, misses, best))
+    os.replace(temporary, path)
+
+
+def main():
+    """
+    Builds a book from the command line.
+    """
+    import argparse
+    from time import perf_counter
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("mode", choices=["density", "montecarlo"])
+    parser.add_argument("-d", "--depth", type=int, default=8,
+                        help="number of shots the book covers")
+    parser.add_argument("-n", "--samples", type=int, default=20000,
+                        help="layouts sampled per position in montecarlo "
+                        "mode")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    positions = build(args.mode, args.depth, args.samples)
+    os.makedirs(book_dir, exist_ok=True)
+    path = os.path.join(book_dir, f"{args.mode}.book")
+    write(path, args.depth, positions)
+    print(f"{len(positions)} positions written to {path} in "
+          f"{perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
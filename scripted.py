@@ -0,0 +1,242 @@
+"""
+Scripted terminal sessions.
+
+Plays the terminal game with the lines of a script standing in for what
+the user types, through the same prompts, parsing, validation and
+rendering as an interactive session, so the terminal path can be load
+tested and profiled without anyone at the keyboard.
+
+A script holds a line for every prompt with the input arrow, in the order
+they come up: the line the rules ask for, then the starting square and
+direction of every ship and then the targets. Screens that only wait for
+enter are passed straight away. Invalid lines are handled the same way as
+in the terminal, i.e. the error is shown and the prompt asked again, which
+takes the next line. A line holding only --- ends the script of a game, and
+the lines of the game left over once it is won or lost are skipped.
+
+`python3 scripted.py run script.txt` plays the script (- or no file reads
+it from standard input) with the output thrown away, and reports how many
+screens per second were played and how long the game took to handle each
+input and draw the next screen. With --no-render the frames are built but
+neither compared to the screen nor written.
+`python3 scripted.py generate -g 10` writes a script of ten games with
+random valid placements and every square as a target, and with
+--errors 0.1 an invalid line before one in ten of its lines.
+"""
+import argparse
+import random
+import sys
+from time import perf_counter
+
+from game import ships, columns, rows, board_engine, place_ships_randomly
+from run import Session, main as run_game
+from stats import percentile
+
+# ends the script of a game
+separator = "---"
+
+# lines that fail validation, by the prompts they are entered at
+invalid_lines = {
+    "square": ["", "Z9", "A", "11", "A1B", "hello"],
+    "direction": ["", "X", "north-east", "5"],
+    "target": ["", "I1", "A9", "88", "target"],
+}
+
+
+class ScriptedSession(Session):
+    """
+    Initializes a session played from a script:
+
+    Answers the prompts with the lines of the script and every other
+    screen with enter, and times how long the game takes from each answer
+    to the next screen waiting for one.
+
+    Raises an EOFError once the script runs out, same as input().
+    """
+
+    def __init__(self, lines, render=True):
+        self.lines = iter(lines)
+        self.rendering = render
+        # whether the screen on display asks for input
+        self.prompted = False
+        # games played through, and boards set up, including the ones set
+        # up along with the session
+        self.games = 0
+        self.setups = 0
+        # why the script stopped
+        self.stop_reason = None
+        self.inputs = 0
+        self.written = 0
+        self.latencies = []
+        self.step_start = None
+        super().__init__()
+
+    def new_game(self):
+        """
+        Sets up fresh boards for both players, skipping the rest of the
+        script of the previous game.
+        """
+        super().new_game()
+        self.setups += 1
+        # every game after the first one follows a game played through
+        if self.setups > 2:
+            self.games += 1
+            while self.next_line() != separator:
+                pass
+
+    def next_line(self):
+        """
+        Returns the next line of the script.
+        """
+        line = next(self.lines, None)
+        if line is None:
+            raise EOFError("The script is finished.")
+        return line.rstrip("\r\n")
+
+    def write(self, text):
+        """
+        Counts the text instead of writing it anywhere.
+        """
+        self.written += len(text)
+
+    def render(self, frame):
+        """
+        Notes whether the frame asks for input and draws it, unless
+        rendering is skipped.
+        """
+        self.prompted = frame.endswith("====>\n")
+        if self.rendering:
+            super().render(frame)
+
+    async def read(self):
+        """
+        Returns the next line of the script if the screen asks for input,
+        or an empty line otherwise.
+        """
+        if self.step_start is not None:
+            self.latencies.append(perf_counter() - self.step_start)
+
+        line = ""
+        if self.prompted:
+            line = self.next_line()
+            if line == separator:
+                raise EOFError(
+                    f"The script of game {self.games + 1} ran out before "
+                    f"the game was over.")
+            self.inputs += 1
+        self.prompted = False
+
+        self.step_start = perf_counter()
+        return line
+
+
+def play_script(lines, render=True):
+    """
+    Plays the script through and returns the session that played it.
+    """
+    session = ScriptedSession(lines, render)
+    try:
+        run_game(session).send(None)
+    except EOFError as e:
+        session.stop_reason = str(e)
+    finally:
+        if session.metrics:
+            session.metrics.write()
+    return session
+
+
+def square(coordinates):
+    """
+    Returns the coordinates the way the user enters them, e.g. B7.
+    """
+    return columns[coordinates[1]] + rows[coordinates[0]]
+
+
+def generate_script(games, errors=0):
+    """
+    Returns the lines of a script of the given number of games, each with
+    a random valid placement of the fleet and every square as a target in
+    random order, with an invalid line before the given share of lines.
+    """
+    def answer(kind, line):
+        if random.random() < errors:
+            lines.append(random.choice(invalid_lines[kind]))
+        lines.append(line)
+
+    lines = ["ok"]
+    for _ in range(games):
+        board = board_engine()
+        layout = place_ships_randomly(board)
+        # the ships are placed in the order the game asks for them
+        layout.sort(key=lambda placement: list(ships).index(placement[0]))
+        for _, start_square, direction in layout:
+            answer("square", square(start_square))
+            answer("direction", direction)
+
+        targets = [(row, column) for row in range(8) for column in range(8)]
+        random.shuffle(targets)
+        for target in targets:
+            answer("target", square(target))
+        lines.append(separator)
+
+    return [line + "\n" for line in lines]
+
+
+def main():
+    """
+    Plays or generates a script from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="play a script")
+    run_parser.add_argument("script", nargs="?", default="-")
+    run_parser.add_argument("--no-render", action="store_true",
+                            help="build the frames without drawing them")
+    run_parser.add_argument("-s", "--seed", type=int,
+                            help="seed for the computer's moves")
+
+    generate_parser = commands.add_parser("generate",
+                                          help="write a script")
+    generate_parser.add_argument("-g", "--games", type=int, default=1)
+    generate_parser.add_argument("-e", "--errors", type=float, default=0,
+                                 help="share of lines with an invalid line "
+                                 "before them")
+    generate_parser.add_argument("-s", "--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.command == "generate":
+        sys.stdout.writelines(generate_script(args.games, args.errors))
+        return
+
+    if args.script == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(args.script) as file:
+            lines = file.readlines()
+
+    start = perf_counter()
+    session = play_script(lines, not args.no_render)
+    elapsed = perf_counter() - start
+
+    latencies = sorted(session.latencies)
+    steps = len(latencies)
+    print(session.stop_reason)
+    print(f"{session.games} games, {session.inputs} lines entered, "
+          f"{steps} screens, {session.written} characters written in "
+          f"{elapsed:.2f} s")
+    if not steps:
+        return
+    print(f"{steps / elapsed:.0f} screens per second, "
+          f"{session.inputs / elapsed:.0f} lines per second")
+    print("time per screen: " + ", ".join(
+        f"p{percent} {percentile(latencies, percent) * 1e6:.0f} µs"
+        for percent in [50, 90, 99]) +
+        f", max {latencies[-1] * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
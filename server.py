@@ -0,0 +1,186 @@
+"""
+Multi-session game server.
+
+Hosts many independent games in a single process. Every connection gets a
+session of its own, played over the raw connection the same way it would
+be played in a terminal, so a web terminal can be pointed at the server
+instead of spawning a new Python process per visitor.
+
+There is no pty between the server and the client, so the server echoes
+the keys the user types, handles backspace and turns newlines into the
+carriage return and line feed pairs the terminal expects.
+
+Every game can be watched by spectators connecting to a second port. The
+first line a spectator sends is the number of the game to watch, games
+being numbered in the order they start, and an empty line picks the game
+started last. After that, spectators are only sent the frames of the game,
+drawn once for all of them (see broadcast.py), until the game ends.
+
+The computer chooses its targets on a thread of its own, so the time a
+move of the density or montecarlo mode takes does not hold up the other
+sessions. Moves are chosen one at a time, as the caches of the targeting
+modes are shared by every session, and the time budget of a move counts
+from when it was queued, so a move that waited for the others gets less
+time to search and the time it takes stays bounded however many sessions
+are playing.
+"""
+import asyncio
+import codecs
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from sys import argv
+from time import perf_counter
+
+from broadcast import Broadcast
+from game import computer_choose_target
+from run import Session, main
+
+# broadcasts of the games being played, keyed by the number of the game
+games = {}
+game_numbers = count(1)
+
+# the computer chooses its targets on a thread of its own, one move at a
+# time, as the caches of the targeting modes are shared by every session
+ai_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai")
+
+
+class ServerSession(Session):
+    """
+    Initializes a session played over a connection to the server.
+    """
+
+    def __init__(self, reader, writer):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        # keys received after the end of the line that was read last
+        self.pending = ""
+        self.number = next(game_numbers)
+        self.broadcast = Broadcast()
+        games[self.number] = self.broadcast
+
+    def write(self, text):
+        """
+        Queues the text to be sent to the client.
+        """
+        self.writer.write(text.replace("\n", "\r\n").encode())
+
+    async def read(self):
+        """
+        Waits for the user to enter a line and returns it, echoing the keys
+        as they are typed.
+
+        Raises an EOFError once the client disconnects, same as input().
+        """
+        line = ""
+        while True:
+            await self.writer.drain()
+            if not self.pending:
+                data = await self.reader.read(1024)
+                if not data:
+                    raise EOFError("Client disconnected.")
+                self.pending = self.decoder.decode(data)
+
+            for idx, key in enumerate(self.pending):
+                if key in "\r\n":
+                    self.pending = self.pending[idx + 1:].lstrip("\n")
+                    self.writer.write(b"\r\n")
+                    return line
+                if key in "\x7f\b":
+                    if line:
+                        line = line[:-1]
+                        self.writer.write(b"\b \b")
+                elif key.isprintable():
+                    line += key
+                    self.writer.write(key.encode())
+            self.pending = ""
+
+    async def choose_target(self, board):
+        """
+        Returns the target the computer chooses on the board, chosen on the
+        thread of the computer, so the other sessions are served meanwhile,
+        within the time budget of the move counted from now.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            ai_executor, computer_choose_target, board, None, perf_counter())
+
+
+async def handle_connection(reader, writer):
+    """
+    Plays games with the client until it disconnects.
+    """
+    session = ServerSession(reader, writer)
+    try:
+        await main(session)
+    except (EOFError, ConnectionError):
+        pass
+    finally:
+        if session.move_log:
+            session.move_log.close()
+        if session.metrics:
+            session.metrics.write()
+        del games[session.number]
+        session.broadcast.close()
+        writer.close()
+
+
+async def discard_input(reader):
+    """
+    Reads what the client sends until it disconnects, throwing it away.
+    """
+    while await reader.read(1024):
+        pass
+
+
+async def handle_spectator(reader, writer):
+    """
+    Sends the frames of the game the client asks for to the client until
+    either the game ends or the client disconnects.
+    """
+    try:
+        line = (await reader.readline()).decode("utf-8", "replace").strip()
+        number = int(line) if line.isdigit() else max(games, default=None)
+        broadcast = games.get(number)
+        if broadcast is None:
+            writer.write(b"There is no such game being played.\r\n")
+            await writer.drain()
+            return
+
+        viewer = broadcast.subscribe()
+        # spectators cannot play, so what they send is only read to tell
+        # when they disconnect
+        tasks = [asyncio.ensure_future(viewer.send_to(writer)),
+                 asyncio.ensure_future(discard_input(reader))]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            broadcast.unsubscribe(viewer)
+            for task in tasks:
+                task.cancel()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, spectator_port):
+    """
+    Accepts connections of players and spectators until the server is
+    stopped.
+    """
+    server = await asyncio.start_server(handle_connection, host, port)
+    spectator_server = await asyncio.start_server(
+        handle_spectator, host, spectator_port)
+    async with server, spectator_server:
+        await asyncio.gather(server.serve_forever(),
+                             spectator_server.serve_forever())
+
+
+if __name__ == "__main__":
+    port = int(argv[1]) if len(argv) > 1 else \
+        int(os.environ.get("GAME_SERVER_PORT", 8023))
+    spectator_port = int(argv[2]) if len(argv) > 2 else \
+        int(os.environ.get("SPECTATOR_PORT", 8024))
+    asyncio.run(serve("127.0.0.1", port, spectator_port))
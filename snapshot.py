@@ -0,0 +1,337 @@
+"""
+Compact binary snapshots of a game.
+
+Packs both boards, their ship counts, where each of their ships lies, the
+chains of hits the computer follows and whose turn it is into around a
+hundred bytes, so an idle game can be written to disk or handed to another
+process and resumed later without keeping its interpreter alive.
+
+A snapshot starts with a header:
+
+    2 bytes   b"BS"
+    1 byte    format version
+    1 byte    flags, bit 0 set if it is the user's turn
+
+followed by the user's board and then the computer's board:
+
+    1 byte        flags, bit 0 set if chains of hits are tracked and bits
+                  1 to 4 set for the ship, orient, hit and miss masks that
+                  have any points in them
+    8 bytes       each of those masks, with bit row * 8 + column standing
+                  for the point
+    1 byte        ship count
+    1 byte        per ship of the fleet, in order, its lowest point, with
+                  bit 6 set if it lies along a row and bit 7 set if it was
+                  placed
+    1 byte        number of points that are part of a chain, then per point:
+                      1 byte  point, with the number of chains less one in
+                              the top two bits
+                      1 byte  ends of the chains, two bits each
+    2 bytes       number of chain ends, then per chain end:
+                      1 byte  point, with the end in the top two bits
+
+Numbers are little-endian. Ends are stored as their position in
+game.directions.
+
+Version 1 snapshots, written before ships were stored, have no ship bytes.
+They are still decoded, into boards that do not know where their ships lie
+and so never count a ship as sunk.
+"""
+import struct
+from sys import argv
+from time import perf_counter
+
+from game import (ships, directions, board_size, board_engine, BitBoard,
+                  SparseBoard, Frontier)
+
+magic = b"BS"
+version = 2
+
+# versions that can still be decoded
+versions = [1, 2]
+
+header = struct.Struct("<2sBB")
+mask = struct.Struct("<Q")
+count = struct.Struct("<H")
+
+# the masks in the order they are stored in
+mask_states = ["ship", "orient", "hit", "miss"]
+
+end_codes = {direction: code for code, direction in enumerate(directions)}
+code_ends = list(directions)
+
+# the (row, column) point of every bit of a mask
+bit_points = [divmod(bit, 8) for bit in range(64)]
+
+# the mask of a ship of every length of the fleet lying from bit 0 along a
+# row, a step of one bit, or along a column, a step of eight, keyed by the
+# length and the step
+ship_runs = {
+    (length, stride): sum(1 << (idx * stride) for idx in range(length))
+    for length in set(ships.values()) for stride in [1, 8]
+}
+
+
+def mask_points(point_mask):
+    """
+    Returns the points of the set bits of the mask, lowest bit first.
+    """
+    points = []
+    while point_mask:
+        # isolate and clear the lowest set bit
+        bit = point_mask & -point_mask
+        point_mask ^= bit
+        points.append(bit_points[bit.bit_length() - 1])
+    return points
+
+
+def board_masks(board):
+    """
+    Returns the masks of the board in the order they are stored in.
+    """
+    masks = board.point_masks()
+    return [masks[state] for state in mask_states]
+
+
+def board_ships(board):
+    """
+    Returns the mask of every placed ship of the board, keyed by the ship.
+    """
+    ship_masks = {}
+    for ship, points in board.ship_points.items():
+        ship_masks[ship] = 0
+        for row, column in points:
+            ship_masks[ship] |= 1 << (row * 8 + column)
+    return ship_masks
+
+
+def board_chains(board):
+    """
+    Returns the chains of every point that is part of one, keyed by the
+    number of its bit, in the order of the points on the board.
+    """
+    if isinstance(board, BitBoard):
+        return {point: board.chains[point] for point in sorted(board.chains)
+                if board.chains[point]}
+    if isinstance(board, SparseBoard):
+        return {row * 8 + column: board.chains[(row, column)]
+                for row, column in sorted(board.chains)
+                if board.chains[(row, column)]}
+
+    return {row * 8 + column: state["chains"]
+            for (row, column), state in board.state.items()
+            if state["is_in_chain"]}
+
+
+def encode_board(board, data):
+    """
+    Appends the board to the snapshot data.
+    """
+    masks = board_masks(board)
+    flags = int(board.track_chains)
+    for idx, state_mask in enumerate(masks):
+        if state_mask:
+            flags |= 2 << idx
+    data.append(flags)
+    for state_mask in masks:
+        if state_mask:
+            data += mask.pack(state_mask)
+    data.append(board.ship_count)
+
+    ship_masks = board_ships(board)
+    for ship in ships:
+        ship_mask = ship_masks.get(ship, 0)
+        lowest = (ship_mask & -ship_mask).bit_length() - 1
+        if ship_mask:
+            # the point after the lowest one is covered if the ship lies
+            # along a row, or the one below it otherwise
+            data.append(lowest | (ship_mask >> (lowest + 1) & 1) << 6 | 128)
+        else:
+            data.append(0)
+
+    chains = board_chains(board)
+    data.append(len(chains))
+
+    for point, point_chains in chains.items():
+        ends = 0
+        for idx, chain in enumerate(point_chains):
+            ends |= end_codes[chain["end"]] << (idx * 2)
+        data.append(point | (len(point_chains) - 1) << 6)
+        data.append(ends)
+
+    data += count.pack(len(board.chain_ends))
+    for (row, column), end in board.chain_ends:
+        data.append(row * 8 + column | end_codes[end] << 6)
+
+
+def decode_board(board, data, offset, snapshot_version=version):
+    """
+    Restores the board from the snapshot data starting at the offset,
+    written in the given version of the format.
+
+    Returns the offset of the data following the board.
+    """
+    flags = data[offset]
+    offset += 1
+    masks = []
+    for idx in range(len(mask_states)):
+        if flags & 2 << idx:
+            masks.append(mask.unpack_from(data, offset)[0])
+            offset += mask.size
+        else:
+            masks.append(0)
+    ship_count = data[offset]
+    offset += 1
+
+    ship_placements = {}
+    for ship, length in ships.items():
+        # version 1 does not store the ships
+        if snapshot_version < 2:
+            break
+        placement = data[offset]
+        offset += 1
+        if not placement & 128:
+            continue
+        lowest = placement & 63
+        # a step along a row is one bit, a step along a column is eight
+        stride = 1 if placement & 64 else 8
+        ship_placements[ship] = (
+            [bit_points[bit]
+             for bit in range(lowest, lowest + length * stride, stride)],
+            ship_runs[(length, stride)] << lowest)
+
+    chain_count = data[offset]
+    offset += 1
+
+    chains = {}
+    for _ in range(chain_count):
+        point, ends = data[offset], data[offset + 1]
+        chains[point & 63] = [{"end": code_ends[ends >> (idx * 2) & 3]}
+                              for idx in range((point >> 6) + 1)]
+        offset += 2
+
+    chain_end_count, = count.unpack_from(data, offset)
+    offset += count.size
+    chain_ends = Frontier()
+    for point in data[offset:offset + chain_end_count]:
+        chain_ends.push(bit_points[point & 63], code_ends[point >> 6])
+    if len(chain_ends) < chain_end_count:
+        raise ValueError("Snapshot is cut short.")
+    offset += chain_end_count
+
+    if isinstance(board, BitBoard):
+        for state, state_mask in zip(mask_states, masks):
+            setattr(board, state, state_mask)
+        board.chains = chains
+    elif isinstance(board, SparseBoard):
+        board.points = {point: state
+                        for state, state_mask in zip(mask_states, masks)
+                        for point in mask_points(state_mask)}
+        board.chains = {bit_points[point]: point_chains
+                        for point, point_chains in chains.items()}
+    else:
+        for state, state_mask in zip(mask_states, masks):
+            for point in mask_points(state_mask):
+                board.state[point]["point"] = state
+        for point, point_chains in chains.items():
+            state = board.state[bit_points[point]]
+            state["chains"] = point_chains
+            state["is_in_chain"] = True
+
+    hit_mask = masks[mask_states.index("hit")]
+    for ship, (points, ship_mask) in ship_placements.items():
+        board.add_ship(ship, points)
+        board.hits_left[ship] -= bin(ship_mask & hit_mask).count("1")
+        # the order the ships sank in is not kept
+        if not board.hits_left[ship]:
+            board.sunk.append(ship)
+
+    board.ship_count = ship_count
+    board.track_chains = bool(flags & 1)
+    board.chain_ends = chain_ends
+
+    return offset
+
+
+def encode(boards, user_turn=True):
+    """
+    Returns a snapshot of the game with the given boards, keyed "user" and
+    "computer" same as Session.boards and Game.boards.
+
+    Raises a ValueError if the boards are not of the standard size or do
+    not hold the standard fleet, which the format has no room for.
+    """
+    for board in boards.values():
+        if board.size != board_size or board.fleet != ships:
+            raise ValueError(
+                "Only boards of the standard size and fleet can be saved.")
+
+    data = bytearray(header.pack(magic, version, int(user_turn)))
+    encode_board(boards["user"], data)
+    encode_board(boards["computer"], data)
+    return bytes(data)
+
+
+def decode(data, engine=None):
+    """
+    Returns the boards and whether it is the user's turn from a snapshot,
+    with the boards backed by the given engine or the BATTLESHIP_ENGINE one.
+
+    Raises a ValueError if the data is not a snapshot in a version of the
+    format that can be decoded.
+    """
+    engine = engine if engine else board_engine
+    boards = {
+        "user": engine(),
+        "computer": engine(user=False)
+    }
+
+    try:
+        snapshot_magic, snapshot_version, flags = header.unpack_from(data)
+        if snapshot_magic != magic:
+            raise ValueError("Data is not a snapshot.")
+        if snapshot_version not in versions:
+            raise ValueError(
+                f"Snapshot version {snapshot_version} is not supported.")
+
+        offset = decode_board(boards["user"], data, header.size,
+                              snapshot_version)
+        offset = decode_board(boards["computer"], data, offset,
+                              snapshot_version)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"Snapshot is cut short: {e}")
+
+    if offset != len(data):
+        raise ValueError("Snapshot has trailing data.")
+
+    return boards, bool(flags & 1)
+
+
+if __name__ == "__main__":
+    # times snapshots of a game halfway through
+    from engine import Game
+
+    runs = int(argv[1]) if len(argv) > 1 else 100000
+    game = Game()
+    game.place_fleet("user")
+    game.place_fleet("computer")
+    while game.shots["computer"] < 30 and not game.is_over():
+        try:
+            game.fire()
+        except ValueError:
+            continue
+
+    data = encode(game.boards, game.user_turn)
+
+    start = perf_counter()
+    for _ in range(runs):
+        encode(game.boards, game.user_turn)
+    encode_time = (perf_counter() - start) / runs
+
+    start = perf_counter()
+    for _ in range(runs):
+        decode(data)
+    decode_time = (perf_counter() - start) / runs
+
+    print(f"{len(data)} bytes, encoded in {encode_time * 1e6:.1f} µs, "
+          f"decoded in {decode_time * 1e6:.1f} µs")
@@ -0,0 +1,14 @@
+"""
+Summary statistics.
+
+Shared by the tournaments, the scripted sessions and the benchmarks, so
+they all report percentiles the same way.
+"""
+
+
+def percentile(values, percent):
+    """
+    Returns the nearest-rank percentile of the sorted values.
+    """
+    rank = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(rank)]
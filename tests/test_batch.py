@@ -0,0 +1,69 @@
+"""
+Checks batch stepping against boards played one at a time, shot by shot,
+and that every fleet gets placed, even ones that often run out of room.
+"""
+import unittest
+
+import numpy as np
+
+from batch import BatchBoards
+from game import Board, RetargetError
+
+
+def board_state(board, state):
+    """
+    Returns a boolean array of the points of the board in the given state.
+    """
+    return np.array([[board.get_point((row, column)) == state
+                      for column in range(8)] for row in range(8)])
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_matches_boards(self):
+        """
+        Firing the same targets, retargeted ones included, on a batch and on
+        a board per game gives the same results and leaves the same hits,
+        misses and ship counts after every shot.
+        """
+        rng = np.random.default_rng(0)
+        batch = BatchBoards(16)
+        batch.place_randomly(rng)
+        boards = [batch.to_board(game, Board) for game in range(len(batch))]
+
+        while not batch.is_over().all():
+            targets = rng.integers(0, 8, (len(batch), 2))
+            results = batch.fire(targets)
+            for game, board in enumerate(boards):
+                with self.subTest(game=game, target=targets[game]):
+                    target = tuple(int(axis) for axis in targets[game])
+                    if board.ship_count == 0:
+                        self.assertEqual(results[game], -1)
+                        continue
+                    try:
+                        hit = board.check_target(target) == "ship"
+                        board.check_hit(target)
+                        self.assertEqual(results[game], int(hit))
+                    except RetargetError:
+                        self.assertEqual(results[game], -1)
+                    self.assertTrue(np.array_equal(
+                        batch.hits[game], board_state(board, "hit")))
+                    self.assertTrue(np.array_equal(
+                        batch.misses[game], board_state(board, "miss")))
+                    self.assertEqual(batch.ship_count[game],
+                                     board.ship_count)
+
+    def test_places_crowded_fleets(self):
+        """
+        A fleet that runs out of room on about one board in eight is placed
+        in full on every board, with no ships overlapping.
+        """
+        fleet = {f"ship {number}": 4 for number in range(12)}
+        batch = BatchBoards(200, fleet)
+        batch.place_randomly(np.random.default_rng(0))
+        self.assertTrue(
+            (batch.ships.sum(axis=(1, 2)) == sum(fleet.values())).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
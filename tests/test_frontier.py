@@ -0,0 +1,153 @@
+"""
+Checks the frontier of chain ends against the list of chain ends it
+replaced, which every operation of the frontier rebuilt or sliced.
+"""
+import random
+import unittest
+
+from engine import Game
+from game import Board, BitBoard, SparseBoard, Frontier, RetargetError, step
+
+
+class ListFrontier():
+    """
+    Initializes a list frontier:
+
+    The chain ends as the list of {"point", "end"} dictionaries the boards
+    used to hold, behind the methods of Frontier.
+    """
+
+    def __init__(self):
+        self.ends = []
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __iter__(self):
+        return iter([(ce["point"], ce["end"]) for ce in self.ends])
+
+    def push(self, point, end):
+        self.ends.extend([{"point": point, "end": end}])
+
+    def pop(self):
+        chain_end = self.ends[-1]
+        self.ends = self.ends[:-1]
+        return chain_end["point"], chain_end["end"]
+
+    def keep_only(self, point, dropped_ends):
+        self.ends = [ce for ce in self.ends if ce["point"] == point and
+                     ce["end"] not in dropped_ends]
+
+    def drop(self, points):
+        self.ends = [ce for ce in self.ends if ce["point"] not in points]
+
+    def next_target(self, board):
+        while True:
+            try:
+                if len(self.ends) == 0:
+                    return None
+                target = step(self.ends[-1]["point"], self.ends[-1]["end"])
+                if board.get_point(target) in ["hit", "miss"]:
+                    raise ValueError("retry")
+                return target
+            except Exception:
+                self.ends = self.ends[:-1]
+                board.retargets += 1
+
+
+def play(seed, engine, frontier, size=None, fleet=None):
+    """
+    Plays a seeded game in chains mode with the given frontier on both
+    boards and returns every shot, the chain ends after every shot and the
+    retargets of both boards.
+    """
+    random.seed(seed)
+    game = Game(engine=engine, modes={"user": "chains", "computer": "chains"},
+                size=size, fleet=fleet)
+    for board in game.boards.values():
+        board.chain_ends = frontier()
+    game.place_fleet("user")
+    game.place_fleet("computer")
+
+    turns = []
+    while not game.is_over():
+        board = game.boards["computer" if game.user_turn else "user"]
+        try:
+            turns.append(game.fire())
+        except RetargetError:
+            turns.append("retarget")
+        turns.append(list(board.chain_ends))
+    return turns, [board.retargets for board in game.boards.values()]
+
+
+class TestFrontier(unittest.TestCase):
+
+    def test_games_match_list(self):
+        """
+        Seeded games play the same shots, chain ends and retargets with
+        either frontier, on every engine and with a larger board and fleet.
+        """
+        setups = [(None, None),
+                  ((20, 20), {"carrier": 5, "battleship": 4, "cruiser": 3,
+                              "submarine": 3, "destroyer": 2, "dinghy": 1})]
+        for engine in [Board, BitBoard, SparseBoard]:
+            for size, fleet in setups:
+                for seed in range(40):
+                    with self.subTest(engine=engine.__name__, size=size,
+                                      seed=seed):
+                        self.assertEqual(
+                            play(seed, engine, Frontier, size, fleet),
+                            play(seed, engine, ListFrontier, size, fleet))
+
+    def test_operations_match_list(self):
+        """
+        Random pushes, pops, keep_only, drop and next_target calls leave
+        both frontiers with the same ends and count the same retargets.
+        """
+        rng = random.Random(0)
+        for _ in range(200):
+            board = Board()
+            reference_board = Board()
+            for row in range(8):
+                for column in range(8):
+                    if rng.random() < 0.4:
+                        state = rng.choice(["hit", "miss"])
+                        board.state[(row, column)]["point"] = state
+                        reference_board.state[(row, column)]["point"] = state
+            frontier, reference = Frontier(), ListFrontier()
+
+            for _ in range(60):
+                operation = rng.choice(
+                    ["push", "push", "push", "pop", "keep_only", "drop",
+                     "next_target"])
+                point = (rng.randrange(8), rng.randrange(8))
+                if operation == "push":
+                    end = rng.choice("NSWE")
+                    # a point has at most one end per direction
+                    if (point, end) in list(frontier):
+                        continue
+                    frontier.push(point, end)
+                    reference.push(point, end)
+                elif operation == "pop":
+                    if not len(reference):
+                        continue
+                    self.assertEqual(frontier.pop(), reference.pop())
+                elif operation == "keep_only":
+                    dropped = rng.sample("NSWE", 2)
+                    frontier.keep_only(point, dropped)
+                    reference.keep_only(point, dropped)
+                elif operation == "drop":
+                    points = [point, (point[0], (point[1] + 1) % 8)]
+                    frontier.drop(points)
+                    reference.drop(points)
+                else:
+                    self.assertEqual(frontier.next_target(board),
+                                     reference.next_target(reference_board))
+                    self.assertEqual(board.retargets,
+                                     reference_board.retargets)
+                self.assertEqual(list(frontier), list(reference))
+                self.assertEqual(len(frontier), len(reference))
+
+
+if __name__ == "__main__":
+    unittest.main()
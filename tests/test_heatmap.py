@@ -0,0 +1,40 @@
+"""
+Checks the heat map kept up to date shot by shot against one built from
+scratch for the same board, once ships start sinking.
+"""
+import random
+import unittest
+
+import numpy as np
+
+from engine import Game
+from heatmap import HeatMap
+
+
+class TestHeatMap(unittest.TestCase):
+
+    def test_sinks_match_fresh_heat_map(self):
+        """
+        After every shot that leaves a ship sunk, the counts and legal
+        placements match a heat map set up for the board from scratch.
+        """
+        for seed in range(10):
+            random.seed(seed)
+            game = Game(modes={"user": "density", "computer": "density"})
+            game.place_fleet("user")
+            game.place_fleet("computer")
+            board = game.boards["user"]
+            while not game.is_over():
+                game.fire()
+                if board.heat_map is None or not board.sunk:
+                    continue
+                with self.subTest(seed=seed, shots=game.shots["computer"]):
+                    fresh = HeatMap(board)
+                    self.assertTrue(np.array_equal(fresh.alive,
+                                                   board.heat_map.alive))
+                    self.assertTrue(np.array_equal(fresh.counts,
+                                                   board.heat_map.counts))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Checks that the time the computer takes to move on the game server stays
+flat as sessions are added, as the time budget of a move counts from when
+it was queued.
+"""
+import asyncio
+import random
+import unittest
+from time import perf_counter
+
+import game
+import montecarlo
+from run import main as run_game
+from scripted import ScriptedSession, generate_script
+from server import ServerSession
+from stats import percentile
+
+
+class TimedSession(ScriptedSession):
+    """
+    Initializes a scripted session choosing its targets the way the server
+    does, timing every move from when it is asked for.
+    """
+
+    def __init__(self, lines):
+        super().__init__(lines, render=False)
+        self.moves = []
+
+    async def choose_target(self, board):
+        start = perf_counter()
+        target = await ServerSession.choose_target(self, board)
+        self.moves.append(perf_counter() - start)
+        return target
+
+
+async def play(sessions):
+    """
+    Plays a game in every session at once, and returns the 99th percentile
+    time the computer took to move.
+    """
+    async def play_session(session):
+        try:
+            await run_game(session)
+        except EOFError:
+            pass
+
+    await asyncio.gather(*[play_session(session) for session in sessions])
+    return percentile(sorted(move for session in sessions
+                             for move in session.moves), 99)
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.mode, self.budget = game.targeting_mode, montecarlo.budget
+        game.targeting_mode = "montecarlo"
+        montecarlo.budget = 0.01
+
+    def tearDown(self):
+        game.targeting_mode, montecarlo.budget = self.mode, self.budget
+
+    def test_move_time_stays_flat(self):
+        """
+        With eight sessions playing at once, the 99th percentile move takes
+        less than three times as long as with a single session, where it
+        took eight times as long when the budget counted from the start of
+        the move.
+        """
+        random.seed(0)
+        single = asyncio.run(play([TimedSession(generate_script(1))]))
+        several = asyncio.run(play([TimedSession(generate_script(1))
+                                    for _ in range(8)]))
+        self.assertLess(several, 3 * single)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Checks that snapshots written in version 1 of the format, before it stored
+the ships, still decode.
+"""
+import unittest
+
+import snapshot
+from game import Board, BitBoard, SparseBoard
+
+# a game 24 shots in, as written by version 1 of snapshot.encode
+version_1 = bytes.fromhex(
+    "425301011b0878081810101010000001010100c0001000000004c100800c0000001b"
+    "8086060e020000000000000008087c0000100000101080000a02e3d82b010000")
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def test_decodes_version_1(self):
+        """
+        Version 1 snapshots decode on every engine, with the shots and ship
+        counts they hold and without any ship to track.
+        """
+        masks = {
+            "user": [1157442765542946824, 0, 54043199840256000,
+                     9223584259778805776],
+            "computer": [8825243264, 0, 34911727564881920,
+                         36046457924489216]
+        }
+        ship_counts = {"user": 12, "computer": 10}
+        for engine in [Board, BitBoard, SparseBoard]:
+            with self.subTest(engine=engine.__name__):
+                boards, user_turn = snapshot.decode(version_1, engine)
+                self.assertTrue(user_turn)
+                for side, board in boards.items():
+                    self.assertEqual(snapshot.board_masks(board), masks[side])
+                    self.assertEqual(board.ship_count, ship_counts[side])
+                    self.assertEqual(board.ship_at, {})
+                    self.assertEqual(board.hits_left, {})
+                    self.assertEqual(board.sunk, [])
+
+    def test_rejects_unknown_versions(self):
+        """
+        Versions other than the ones that can be decoded raise a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            snapshot.decode(version_1[:2] + b"\x03" + version_1[3:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+AI tournament runner.
+
+Plays computer vs computer games between two targeting modes on all cores
+and reports how many shots each mode needed to win.
+
+Every game seeds the random number generator of the process playing it
+with the tournament seed plus the game number, so a tournament gives the
+same results no matter how the games are spread across the processes.
+For that, the endgame solver has no time budget in a tournament, being
+cut off by its limit on positions alone, and its cache is cleared before
+every game, so no game depends on the positions an earlier game of the
+same process solved. Games in production keep to the time budget, so the
+solver gives up on a few more positions there than in a tournament. The
+montecarlo mode samples until its time budget runs out, so tournaments it
+plays in are not reproducible.
+"""
+import argparse
+import random
+from math import inf
+from multiprocessing import Pool
+from os import cpu_count
+from time import perf_counter
+
+import endgame
+from game import targeting_modes
+from engine import Game
+from stats import percentile
+
+
+def lift_solver_budget():
+    """
+    Lets the endgame solver of the process run until its limit on positions,
+    however long that takes, so where it gives up does not depend on the
+    clock.
+    """
+    endgame.budget = endgame.density_budget = inf
+
+
+def play_game(game):
+    """
+    Plays a single game of the tournament.
+
+    Expects a (game number, seed, mode, mode) tuple. The modes swap sides
+    every other game, as the user side always fires first.
+
+    Returns the game number, the winning mode and the shots it took to win.
+    """
+    number, seed, mode_a, mode_b = game
+    random.seed(seed + number)
+    endgame.cache.clear()
+
+    if number % 2:
+        mode_a, mode_b = mode_b, mode_a
+    modes = {"user": mode_a, "computer": mode_b}
+
+    game = Game(modes=modes)
+    game.place_fleet("user")
+    game.place_fleet("computer")
+    winner = game.play()
+
+    return number, modes[winner], game.shots[winner]
+
+
+def run_tournament(games, mode_a, mode_b, seed=0, processes=None, log=None):
+    """
+    Plays the games on a pool of processes, one per core by default.
+
+    Results are aggregated as they stream in and written to the log file
+    object, if one is passed in, as comma-separated lines.
+
+    Returns the shots it took each mode to win its games and the games per
+    second.
+    """
+    for mode in (mode_a, mode_b):
+        if mode not in targeting_modes:
+            raise ValueError(f"{mode} is not one of the targeting modes.")
+
+    shots_to_win = {mode_a: [], mode_b: []}
+    tasks = ((number, seed, mode_a, mode_b) for number in range(games))
+
+    start = perf_counter()
+    with Pool(processes or cpu_count(), lift_solver_budget) as pool:
+        for number, winner, shots in pool.imap_unordered(
+                play_game, tasks, chunksize=64):
+            shots_to_win[winner].append(shots)
+            if log:
+                log.write(f"{number},{winner},{shots}\n")
+    elapsed = perf_counter() - start
+
+    return shots_to_win, games / elapsed
+
+
+def main():
+    """
+    Runs a tournament from the command line and prints the summary.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("mode_a", choices=targeting_modes)
+    parser.add_argument("mode_b", choices=targeting_modes)
+    parser.add_argument("-n", "--games", type=int, default=10000)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-p", "--processes", type=int, default=None)
+    parser.add_argument("-l", "--log", type=argparse.FileType("w"),
+                        help="file to write every game's result to")
+    args = parser.parse_args()
+
+    shots_to_win, rate = run_tournament(
+        args.games, args.mode_a, args.mode_b, args.seed, args.processes,
+        args.log)
+
+    print(f"{args.games} games ({rate:.0f} games per second)")
+    for mode, shots in shots_to_win.items():
+        if not shots:
+            print(f"{mode}: 0 wins")
+            continue
+        shots.sort()
+        print(f"{mode}: {len(shots)} wins, "
+              f"{sum(shots) / len(shots):.1f} mean shots to win, "
+              f"p50 {percentile(shots, 50)}, p90 {percentile(shots, 90)}, "
+              f"p99 {percentile(shots, 99)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Pre-forked game processes for the web terminal.
+
+Launching `python3 run.py` for every visitor means every visitor waits for
+the interpreter to start and the game to be imported. Instead, a zygote
+imports the game once and keeps a small pool of forked children waiting on
+a Unix socket. Forked children share the zygote's memory until they write
+to it.
+
+The web terminal then launches `python3 zygote.py connect`, which only
+imports the standard library. It hands its terminal over to a waiting
+child and waits until the game ends. If no zygote is running it falls
+back to running the game itself.
+
+Start the zygote with `python3 zygote.py serve`.
+"""
+import os
+import socket
+import sys
+
+socket_path = os.environ.get("ZYGOTE_SOCKET", "/tmp/battleship-zygote.sock")
+
+
+def play_in_child(listener, notify):
+    """
+    Waits for a connection, takes over the terminal it hands over and
+    plays a game in it. Never returns.
+    """
+    import random
+    import signal
+
+    from run import play_in_terminal
+
+    connection, _ = listener.accept()
+    listener.close()
+    # let the zygote know to fork a replacement
+    os.write(notify, b"+")
+    os.close(notify)
+
+    exit_code = 1
+    try:
+        term, fds, _, _ = socket.recv_fds(connection, 1024, 3)
+        os.environ["TERM"] = term.decode()
+
+        # leave the zygote's process group, so the game is not stopped
+        # along with the idle children
+        os.setsid()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # the children would otherwise all share the zygote's random state
+        random.seed()
+
+        # the terminal stays controlled by the connecting process, so once
+        # the web terminal closes it reading or writing fails instead of the
+        # game being hung up on
+        try:
+            play_in_terminal()
+            exit_code = 0
+        except (EOFError, OSError, KeyboardInterrupt):
+            exit_code = 0
+    finally:
+        try:
+            connection.sendall(bytes([exit_code]))
+        finally:
+            os._exit(exit_code)
+
+
+def serve(pool_size):
+    """
+    Imports the game and keeps the given number of children waiting for
+    connections until interrupted.
+    """
+    import gc
+    import signal
+
+    import game
+    import run  # noqa: F401, imported so the children do not have to
+
+    # the density and montecarlo modes would otherwise import NumPy in every
+    # child
+    if game.targeting_mode == "density":
+        import heatmap  # noqa: F401
+    if game.targeting_mode == "montecarlo":
+        import montecarlo  # noqa: F401
+    # and map the opening book of the mode, so the children share its pages,
+    # along with the endgame solver
+    if game.targeting_mode in ("density", "montecarlo"):
+        import endgame  # noqa: F401
+        import openingbook
+
+        openingbook.get_book(game.targeting_mode)
+
+    # the idle children share the zygote's process group, so they can all
+    # be stopped along with it, while children playing a game have their
+    # own session
+    os.setpgrp()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    notify_read, notify_write = os.pipe()
+
+    # children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    # keeps the garbage collector from touching, and so copying, the pages
+    # shared with the children
+    gc.freeze()
+
+    def fork_child():
+        if os.fork() == 0:
+            # a child must never fall back into the zygote's loop, e.g. when
+            # interrupted while waiting for a connection
+            try:
+                os.close(notify_read)
+                play_in_child(listener, notify_write)
+            finally:
+                os._exit(1)
+
+    for _ in range(pool_size):
+        fork_child()
+
+    print(f"Zygote listening on {socket_path} with {pool_size} children.")
+    try:
+        while True:
+            for _ in os.read(notify_read, 64):
+                fork_child()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.unlink(socket_path)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        os.killpg(0, signal.SIGTERM)
+
+
+def connect():
+    """
+    Hands the terminal over to a child of the zygote and exits with its exit
+    code once the game ends. Runs the game itself if there is no zygote.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        os.execv(sys.executable, [sys.executable, "run.py"])
+
+    term = os.environ.get("TERM", "xterm-color")
+    socket.send_fds(connection, [term.encode()], [0, 1, 2])
+
+    exit_code = connection.recv(1)
+    sys.exit(exit_code[0] if exit_code else 1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(int(sys.argv[2]) if len(sys.argv) > 2 else 4)
+    elif len(sys.argv) > 1 and sys.argv[1] == "connect":
+        connect()
+    else:
+        print("Usage: python3 zygote.py serve [pool size] | connect")